@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import argparse
+import os
 import platform
 import shutil
 import socket
@@ -92,14 +93,22 @@ def find_available_port(
     sys.exit(f"✗ Could not find a free port after trying {start_port}-{port - 1}.")
 
 
-def run_server(cmd: list[str], cwd: Path, port: int) -> None:
+def run_server(cmd: list[str], cwd: Path, port: int, workers: int) -> None:
     header(f"Starting backend on port {port}")
     print(f"\n\033[1;32m  ➜  Local:   http://localhost:{port}\033[0m\n")
     if not DEBUG:
         print("    (server logs hidden -- re-run with --debug to see them)\n")
 
     stdio = None if DEBUG else subprocess.DEVNULL
-    subprocess.run(cmd, cwd=cwd, stdout=stdio, stderr=stdio)
+    # the backend reads WORKERS too, it changes how MCP sessions are handled
+    env = {**os.environ, "WORKERS": str(workers)}
+    subprocess.run(
+        cmd + ["--workers", str(workers)],
+        cwd=cwd,
+        env=env,
+        stdout=stdio,
+        stderr=stdio,
+    )
 
 
 def setup_backend_uv() -> None:
@@ -107,9 +116,9 @@ def setup_backend_uv() -> None:
     run(["uv", "sync"], cwd=BACKEND_DIR, label="uv sync")
 
 
-def start_backend_uv(port: int) -> None:
+def start_backend_uv(port: int, workers: int) -> None:
     cmd = ["uv", "run", "uvicorn", "app.main:app", "--port", str(port)]
-    run_server(cmd, BACKEND_DIR, port)
+    run_server(cmd, BACKEND_DIR, port, workers)
 
 
 def setup_backend_pip() -> Path:
@@ -142,7 +151,7 @@ def setup_backend_pip() -> Path:
     return scripts_dir / ("uvicorn.exe" if IS_WINDOWS else "uvicorn")
 
 
-def start_backend_pip(uvicorn_bin: Path, port: int) -> None:
+def start_backend_pip(uvicorn_bin: Path, port: int, workers: int) -> None:
     if not uvicorn_bin.exists():
         sys.exit(
             "✗ Could not find the 'uvicorn' CLI in the venv.\n"
@@ -150,7 +159,7 @@ def start_backend_pip(uvicorn_bin: Path, port: int) -> None:
         )
 
     cmd = [str(uvicorn_bin), "app.main:app", "--port", str(port)]
-    run_server(cmd, BACKEND_DIR, port)
+    run_server(cmd, BACKEND_DIR, port, workers)
 
 
 def build_frontend() -> None:
@@ -179,6 +188,13 @@ def parse_args() -> argparse.Namespace:
         help="Verbose output: show every command run, its full live output, "
         "and live server logs.",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Backend worker processes (default 1). Set CACHE_BACKEND=sqlite or "
+        "redis in backend/.env so they share the response cache.",
+    )
     return parser.parse_args()
 
 
@@ -214,10 +230,10 @@ def main() -> None:
         header(f"Port {DEFAULT_PORT} is busy -- using {port} instead")
 
     if use_uv:
-        start_backend_uv(port)
+        start_backend_uv(port, args.workers)
     else:
         assert uvicorn_bin is not None
-        start_backend_pip(uvicorn_bin, port)
+        start_backend_pip(uvicorn_bin, port, args.workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import httpx
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class UpstreamUnavailable(HTTPException):
+    def __init__(self, endpoint: str):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"upstream {endpoint} is unavailable, try again shortly",
+        )
+
+
+def is_failure(result: object) -> bool:
+    return isinstance(result, httpx.Response) and result.status_code >= 500
+
+
+class CircuitBreaker:
+    # closed -> open after consecutive failures, half-open probe after the
+    # reset timeout; the in-flight limit grows additively on fast successes
+    # and halves on failures or slow responses (AIMD), callers over the limit
+    # queue briefly for a slot
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.limit = float(settings.breaker_initial_limit)
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    def admit(self) -> str:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < settings.breaker_reset_timeout:
+                return "reject"
+            self.state = "half_open"
+        if self.state == "half_open":
+            return "go" if self.in_flight == 0 else "reject"
+        return "go" if self.in_flight < int(self.limit) else "wait"
+
+    async def wait_for_slot(self) -> bool:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, settings.breaker_queue_timeout)
+            return True
+        except (TimeoutError, asyncio.CancelledError) as exc:
+            # release() may have handed us the slot just before the timeout or
+            # a cancellation (request deadline) landed, give it back
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            return False
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # the slot is handed over, the woken caller does not count again
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def record_success(self, elapsed: float) -> None:
+        self.failures = 0
+        self.state = "closed"
+        if elapsed > settings.breaker_latency_target:
+            self.limit = max(settings.breaker_min_limit, self.limit / 2)
+        else:
+            self.limit = min(settings.breaker_max_limit, self.limit + 1 / self.limit)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.limit = max(settings.breaker_min_limit, self.limit / 2)
+        if (
+            self.state == "half_open"
+            or self.failures >= settings.breaker_failure_threshold
+        ):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if not settings.breaker_enabled:
+            return await fn()
+        admission = self.admit()
+        if admission == "reject" or (
+            admission == "wait" and not await self.wait_for_slot()
+        ):
+            self.rejected += 1
+            raise UpstreamUnavailable(self.name)
+        if admission == "go":
+            self.in_flight += 1
+        start = time.monotonic()
+        try:
+            result = await fn()
+        except (httpx.TimeoutException, httpx.TransportError):
+            self.record_failure()
+            raise
+        finally:
+            self.release()
+        if is_failure(result):
+            self.record_failure()
+        else:
+            self.record_success(time.monotonic() - start)
+        return result
+
+    def stats(self) -> dict[str, str | int | float]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+        }
+
+
+breakers = {
+    name: CircuitBreaker(name)
+    for name in ("login", "server.php", "managetoken", "profile.php", "pluginfile")
+}
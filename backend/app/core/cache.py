@@ -0,0 +1,323 @@
+import abc
+import asyncio
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+# wall clock rather than monotonic: shared entries are compared by other
+# processes and survive restarts
+clock = time.time
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    stored_at: float
+    expires_at: float
+    keep_until: float
+
+    @property
+    def age(self) -> float:
+        return clock() - self.stored_at
+
+    @property
+    def fresh(self) -> bool:
+        return clock() < self.expires_at
+
+    @property
+    def stale_for(self) -> float:
+        return max(0.0, clock() - self.expires_at)
+
+
+class BaseCache(abc.ABC):
+    # counters are per process, even when the entries are shared. Entry access
+    # is async so shared backends keep their I/O off the event loop
+    backend = "base"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abc.abstractmethod
+    async def _load(self, key: Hashable) -> CacheEntry | None: ...
+
+    @abc.abstractmethod
+    async def _store(self, key: Hashable, entry: CacheEntry) -> None: ...
+
+    @abc.abstractmethod
+    async def delete(self, key: Hashable) -> None: ...
+
+    @abc.abstractmethod
+    def size(self) -> int | None: ...
+
+    @abc.abstractmethod
+    async def clear(self) -> None: ...
+
+    async def lookup(self, key: Hashable) -> CacheEntry | None:
+        # stale entries are still returned (and counted as misses) until
+        # their keep window runs out, callers decide whether to serve them
+        entry = await self._load(key)
+        if entry is not None and entry.keep_until <= clock():
+            await self.delete(key)
+            entry = None
+        if entry is None or not entry.fresh:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def get(self, key: Hashable) -> Any | None:
+        entry = await self.lookup(key)
+        return entry.value if entry is not None and entry.fresh else None
+
+    async def set(
+        self, key: Hashable, value: Any, ttl: float, keep: float = 0
+    ) -> None:
+        if ttl <= 0:
+            return
+        now = clock()
+        await self._store(
+            key, CacheEntry(value, now, now + ttl, now + max(ttl, keep))
+        )
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "entries": self.size(),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class TTLCache(BaseCache):
+    backend = "memory"
+
+    def __init__(self, max_entries: int):
+        super().__init__(max_entries)
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+
+    async def _load(self, key: Hashable) -> CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def _store(self, key: Hashable, entry: CacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+
+class SharedCache(BaseCache):
+    # values leave the process, so they go through dumps/loads; keys are hashed
+    # so credentials inside them are never written out
+    def __init__(
+        self,
+        max_entries: int,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+    ):
+        super().__init__(max_entries)
+        self.dumps = dumps
+        self.loads = loads
+
+    @staticmethod
+    def digest(key: Hashable) -> str:
+        return hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+
+
+class SQLiteCache(SharedCache):
+    # one file shared by every worker; WAL lets readers run next to a writer.
+    # Queries run in a thread, and a write still locked out after the short
+    # busy timeout is dropped (a read counts as a miss) rather than waited on
+    backend = "sqlite"
+    busy_timeout = 0.25
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        max_entries: int,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+    ):
+        super().__init__(max_entries, dumps, loads)
+        # one table per cache, eviction only counts its own entries
+        self.table = name
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # workers starting together may wait on each other for the schema
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.lock = threading.Lock()
+        self.db.executescript(
+            f"""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS {name} (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                keep_until REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS {name}_stored ON {name} (stored_at);
+            """
+        )
+        self.db.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+
+    def _select(self, key: str) -> tuple | None:
+        with self.lock:
+            try:
+                return self.db.execute(
+                    f"SELECT value, stored_at, expires_at, keep_until"
+                    f" FROM {self.table} WHERE key = ?",
+                    (key,),
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # locked past the busy timeout
+                return None
+
+    async def _load(self, key: Hashable) -> CacheEntry | None:
+        row = await asyncio.to_thread(self._select, self.digest(key))
+        if row is None:
+            return None
+        value, *times = row
+        return CacheEntry(self.loads(value), *times)
+
+    def _insert(self, key: str, value: bytes, entry: CacheEntry) -> None:
+        try:
+            with self.lock, self.db:
+                self.db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?)",
+                    (key, value, entry.stored_at, entry.expires_at, entry.keep_until),
+                )
+                # oldest writes go first, reads are not tracked to keep them cheap
+                evicted = self.db.execute(
+                    f"DELETE FROM {self.table} WHERE key IN"
+                    f" (SELECT key FROM {self.table}"
+                    " ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+        except sqlite3.OperationalError:
+            return
+        self.evictions += evicted
+
+    async def _store(self, key: Hashable, entry: CacheEntry) -> None:
+        await asyncio.to_thread(
+            self._insert, self.digest(key), self.dumps(entry.value), entry
+        )
+
+    def _remove(self, key: str) -> None:
+        try:
+            with self.lock, self.db:
+                self.db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+        except sqlite3.OperationalError:
+            pass
+
+    async def delete(self, key: Hashable) -> None:
+        await asyncio.to_thread(self._remove, self.digest(key))
+
+    def size(self) -> int:
+        with self.lock:
+            return self.db.execute(f"SELECT count(*) FROM {self.table}").fetchone()[0]
+
+    async def clear(self) -> None:
+        def clear() -> None:
+            with self.lock, self.db:
+                self.db.execute(f"DELETE FROM {self.table}")
+
+        await asyncio.to_thread(clear)
+
+
+class RedisCache(SharedCache):
+    # anything speaking the redis protocol works (valkey, dragonfly, ...).
+    # Entries expire server side after their keep window, eviction is left to
+    # the server's maxmemory policy, so max_entries is only reported. Uses the
+    # asyncio client, the event loop never waits on the network
+    backend = "redis"
+    header = struct.Struct("!ddd")
+
+    def __init__(
+        self,
+        url: str,
+        name: str,
+        max_entries: int,
+        dumps: Callable[[Any], bytes],
+        loads: Callable[[bytes], Any],
+    ):
+        super().__init__(max_entries, dumps, loads)
+        self.prefix = f"mydylms:{name}:"
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:  # optional, see the "redis" extra
+            raise RuntimeError(
+                "CACHE_BACKEND=redis needs the redis package (the redis extra)"
+            ) from exc
+        self.db = redis.Redis.from_url(url)
+
+    async def _load(self, key: Hashable) -> CacheEntry | None:
+        blob = await self.db.get(self.prefix + self.digest(key))
+        if blob is None:
+            return None
+        times = self.header.unpack_from(blob)
+        return CacheEntry(self.loads(blob[self.header.size :]), *times)
+
+    async def _store(self, key: Hashable, entry: CacheEntry) -> None:
+        blob = self.header.pack(entry.stored_at, entry.expires_at, entry.keep_until)
+        await self.db.set(
+            self.prefix + self.digest(key),
+            blob + self.dumps(entry.value),
+            px=max(1, int((entry.keep_until - entry.stored_at) * 1000)),
+        )
+
+    async def delete(self, key: Hashable) -> None:
+        await self.db.delete(self.prefix + self.digest(key))
+
+    def size(self) -> None:
+        return None
+
+    async def clear(self) -> None:
+        async for key in self.db.scan_iter(self.prefix + "*"):
+            await self.db.delete(key)
+
+
+def create_cache(
+    backend: str,
+    name: str,
+    max_entries: int,
+    dumps: Callable[[Any], bytes],
+    loads: Callable[[bytes], Any],
+    path: str = ":memory:",
+    url: str = "",
+) -> BaseCache:
+    if backend == "sqlite":
+        return SQLiteCache(path, name, max_entries, dumps, loads)
+    if backend == "redis":
+        return RedisCache(url, name, max_entries, dumps, loads)
+    return TTLCache(max_entries)
@@ -0,0 +1,177 @@
+import bisect
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from app.core.codec import validate
+from app.core.config import settings
+from app.schemas.calendar import CalendarBase
+
+
+class EventIndex:
+    # events are points in time (timestart), so a list of (timestart, id) kept
+    # sorted with bisect is all the interval index they need: a range is two
+    # binary searches plus the events it returns
+    def __init__(self):
+        self.events: dict[int, CalendarBase] = {}
+        self.starts: list[tuple[int, int]] = []
+        self.source: bytes | None = None
+        self.refreshed_at = 0.0
+
+    @staticmethod
+    def position(event_id: int, event: CalendarBase) -> tuple[int, int]:
+        return event.date or 0, event_id
+
+    def _remove(self, event_id: int, event: CalendarBase) -> None:
+        position = self.position(event_id, event)
+        at = bisect.bisect_left(self.starts, position)
+        if at < len(self.starts) and self.starts[at] == position:
+            del self.starts[at]
+
+    def apply(self, events: list[CalendarBase]) -> int:
+        # only events that are new or carry a newer timemodified are re-indexed,
+        # events missing from the upstream list are dropped
+        changed = 0
+        current: dict[int, CalendarBase] = {}
+        anonymous = 0
+        for event in events:
+            if event.id is None:
+                # nothing to track it by: keyed by its place among the id-less
+                # events (negative, never a moodle id) and re-indexed every time
+                anonymous += 1
+                current[-anonymous] = event
+            else:
+                current[event.id] = event
+        for event_id in self.events.keys() - current.keys():
+            self._remove(event_id, self.events.pop(event_id))
+            changed += 1
+        for event_id, event in current.items():
+            known = self.events.get(event_id)
+            if (
+                known is not None
+                and event_id >= 0
+                and (known.created_at or 0) >= (event.created_at or 0)
+            ):
+                continue
+            if known is not None:
+                self._remove(event_id, known)
+            self.events[event_id] = event
+            bisect.insort(self.starts, self.position(event_id, event))
+            changed += 1
+        return changed
+
+    def range(
+        self, start: int | None = None, end: int | None = None, limit: int | None = None
+    ) -> list[CalendarBase]:
+        # start inclusive, end exclusive
+        lo = 0 if start is None else bisect.bisect_left(self.starts, (start,))
+        hi = (
+            len(self.starts)
+            if end is None
+            else bisect.bisect_left(self.starts, (end,))
+        )
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self.events[event_id] for _, event_id in self.starts[lo:hi]]
+
+    def upcoming(self, limit: int, now: float | None = None) -> list[CalendarBase]:
+        return self.range(int(time.time() if now is None else now), None, limit)
+
+
+class CalendarStore:
+    # one index per API key (the key identifies the user), least recently used
+    # ones are dropped past max_users
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self.indexes: OrderedDict[str, EventIndex] = OrderedDict()
+        self.refreshes = 0
+        self.reindexed = 0
+
+    def refresh(self, key: str, content: bytes, events: list) -> EventIndex:
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = EventIndex()
+            while len(self.indexes) > self.max_users:
+                self.indexes.popitem(last=False)
+        self.indexes.move_to_end(key)
+        # the same cached upstream body needs no work at all
+        if content != index.source:
+            self.refreshes += 1
+            self.reindexed += index.apply(validate(list[CalendarBase], events))
+            index.source = content
+            index.refreshed_at = time.time()
+        return index
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "users": len(self.indexes),
+            "events": sum(len(index.events) for index in self.indexes.values()),
+            "refreshes": self.refreshes,
+            "reindexed": self.reindexed,
+        }
+
+
+calendar_store = CalendarStore(settings.calendar_max_users)
+
+
+def ical_text(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def ical_time(timestamp: int | float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def fold(line: str) -> str:
+    # RFC 5545 lines are at most 75 octets, continuations start with a space
+    data = line.encode()
+    if len(data) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(data):
+        end = min(start + (75 if not parts else 74), len(data))
+        # never split a multi-byte character
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(data[start:end].decode())
+        start = end
+    return "\r\n ".join(parts)
+
+
+def uid(event: CalendarBase) -> str:
+    if event.id is not None:
+        return str(event.id)
+    # stable across exports as long as the event itself does not change
+    identity = f"{event.date}\n{event.event_title}".encode()
+    return hashlib.blake2b(identity, digest_size=8).hexdigest()
+
+
+def to_ical(events: list[CalendarBase], name: str) -> str:
+    now = ical_time(time.time())
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//mydylms-client//calendar//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{ical_text(name)}",
+    ]
+    for event in events:
+        if event.date is None:
+            continue
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{uid(event)}@mydylms-client",
+            f"DTSTAMP:{ical_time(event.created_at) if event.created_at else now}",
+            f"DTSTART:{ical_time(event.date)}",
+            f"SUMMARY:{ical_text(event.event_title or '')}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return "".join(fold(line) + "\r\n" for line in lines)
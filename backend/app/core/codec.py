@@ -0,0 +1,73 @@
+import functools
+import json
+from typing import Any, get_args, get_origin
+
+import httpx
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.core.metrics import validation_duration
+from app.core.tracing import span
+
+try:
+    import orjson
+except ImportError:  # optional, see the "speedups" extra
+    orjson = None
+
+
+def loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def decode(response: httpx.Response) -> Any:
+    # cached responses are shared between requests, so the decoded body is
+    # kept on the response and must be treated as read-only by callers
+    if "decoded" not in response.extensions:
+        with span("decode", size=str(len(response.content))):
+            response.extensions["decoded"] = loads(response.content)
+    return response.extensions["decoded"]
+
+
+def is_object(response: httpx.Response) -> bool:
+    # webservice data comes back as lists, moodle exceptions as objects
+    return response.content[:1] == b"{"
+
+
+@functools.cache
+def adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def type_name(tp: Any) -> str:
+    if args := get_args(tp):
+        return f"{type_name(get_origin(tp))}[{', '.join(map(type_name, args))}]"
+    return getattr(tp, "__name__", None) or str(tp)
+
+
+def validate(tp: Any, data: Any) -> Any:
+    with span("validate", validation_duration, model=type_name(tp)):
+        return adapter(tp).validate_python(data)
+
+
+def parse(tp: Any, response: httpx.Response) -> Any:
+    # validating the raw bytes skips building the intermediate python objects,
+    # unless something already decoded the body
+    if "decoded" in response.extensions:
+        return validate(tp, response.extensions["decoded"])
+    with span("validate", validation_duration, model=type_name(tp)):
+        return adapter(tp).validate_json(response.content)
+
+
+class ModelResponse(Response):
+    # validated data dumped straight to JSON bytes by pydantic-core; returning a
+    # Response also keeps FastAPI from validating the response_model again
+    media_type = "application/json"
+
+    def __init__(self, tp: Any, content: Any, status_code: int = 200, **kwargs):
+        with span("serialize", model=type_name(tp)):
+            body = adapter(tp).dump_json(content)
+        super().__init__(body, status_code, **kwargs)
+
+
+def respond(tp: Any, data: Any, status_code: int = 200) -> ModelResponse:
+    return ModelResponse(tp, validate(tp, data), status_code)
@@ -1,3 +1,6 @@
+import os
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -14,5 +17,119 @@ class Settings(BaseSettings):
     webview_host: str = "127.0.0.1"
     webview_port: int = 8080
 
+    data_dir: str = os.path.join(os.path.expanduser("~"), ".mydylms")
+
+    # Workers
+    workers: int = 1
+
+    # LMS
+    lms_url: str = "https://mydy.dypatil.edu/rait"
+
+    # HTTP client
+    http_max_connections: int = 100
+    http_max_keepalive: int = 20
+    http_keepalive_expiry: float = 30
+    http2: bool = False
+    http_connect_timeout: float = 5
+    http_read_timeout: float = 30
+    http_write_timeout: float = 10
+    http_pool_timeout: float = 5
+    http_warmup_connections: int = 2
+
+    # Retry
+    request_deadline: float = 20
+    retry_attempts: int = 3
+    retry_backoff_base: float = 0.2
+    retry_backoff_max: float = 2
+
+    # Circuit breaker
+    breaker_enabled: bool = True
+    breaker_failure_threshold: int = 5
+    breaker_reset_timeout: float = 30
+    breaker_initial_limit: int = 20
+    breaker_min_limit: int = 2
+    breaker_max_limit: int = 100
+    breaker_latency_target: float = 5
+    breaker_queue_timeout: float = 5
+
+    # Tracing
+    trace_enabled: bool = True
+    server_timing: bool = False
+    trace_slow_threshold: float = 1
+    trace_buffer_size: int = 100
+
+    # Cache
+    cache_enabled: bool = True
+    cache_max_entries: int = 1024
+    cache_backend: Literal["memory", "sqlite", "redis"] = "memory"
+    cache_db_path: str | None = None
+    cache_redis_url: str = "redis://127.0.0.1:6379/0"
+    cache_default_ttl: float = 60
+    cache_ttl: dict[str, float] = {
+        "local_user_details_custom": 600,
+        "local_user_courses_custom": 600,
+        "core_enrol_get_users_courses": 600,
+        "core_course_get_contents": 300,
+        "local_user_attendence_custom": 120,
+        "core_calendar_get_calendar_events": 120,
+        "local_user_announcements_custom": 60,
+        "local_user_announcementsall_custom": 60,
+    }
+    # serve-stale window past the TTL, with a background refresh
+    cache_max_stale: dict[str, float] = {
+        "local_user_courses_custom": 3600,
+        "local_user_attendence_custom": 900,
+        "core_calendar_get_calendar_events": 900,
+        "local_user_announcements_custom": 600,
+        "local_user_announcementsall_custom": 600,
+    }
+    cache_stale_if_error: float = 86400
+    coalesce_enabled: bool = True
+    cache_control_default: str = "private, no-cache"
+    cache_control: dict[str, str] = {
+        "/v1/attendance": "private, max-age=60, stale-while-revalidate=300",
+        "/v1/calendar": "private, max-age=60, stale-while-revalidate=300",
+        "/v1/annoucement": "private, max-age=30, stale-while-revalidate=120",
+        "/v1/content": "private, max-age=60, stale-while-revalidate=600",
+        "/v1/content/changes": "private, no-cache",
+        "/v1/content/course/{course_id}/changes": "private, no-cache",
+        "/v1/dashboard": "private, max-age=30, stale-while-revalidate=300",
+        "/v1/user/profile": "private, max-age=300, stale-while-revalidate=3600",
+        "/v0/user/profile": "private, max-age=300, stale-while-revalidate=3600",
+    }
+
+    # Content
+    content_fanout_concurrency: int = 8
+    doc_cache_enabled: bool = True
+    doc_cache_max_bytes: int = 2 * 1024**3
+    export_concurrency: int = 4
+
+    # Sessions
+    session_ttl: float = 4 * 3600
+    session_max_entries: int = 1024
+
+    # Prefetch
+    prefetch_enabled: bool = False
+    prefetch_course_contents: bool = True
+    prefetch_max_courses: int = 12
+
+    # Announcements
+    announcement_poll_min_interval: float = 30
+    announcement_poll_max_interval: float = 300
+    announcement_poll_idle_timeout: float = 900
+    announcement_queue_size: int = 100
+    sse_keepalive: float = 15
+
+    # Calendar
+    calendar_max_users: int = 256
+    calendar_upcoming_default: int = 10
+
+    # Search
+    search_db_path: str | None = None
+    search_refresh_interval: float = 900
+
+    # Sync
+    sync_db_path: str | None = None
+
 
 settings = Settings()
@@ -0,0 +1,20 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+
+@dataclass
+class RequestState:
+    data_age: float | None = None
+    # monotonic time by which upstream work for this request must finish
+    deadline: float | None = None
+
+
+request_state: ContextVar[RequestState | None] = ContextVar(
+    "request_state", default=None
+)
+
+
+def note_data_age(age: float) -> None:
+    state = request_state.get()
+    if state is not None:
+        state.data_age = max(age, state.data_age or 0.0)
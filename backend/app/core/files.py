@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import BinaryIO
+
+import httpx
+
+from app.core.config import settings
+
+
+# refs/ maps a document version (url + timemodified) to a blob named by the
+# sha256 of its bytes, so identical files are stored once. Everything is written
+# to tmp/ and renamed into place, concurrent writers never expose partial files.
+# The store is shared by every user, so a ref also lists the readers (digests of
+# session and key) moodle is known to have handed the file to.
+class DocumentStore:
+    max_readers = 64
+
+    def __init__(self, root: str | os.PathLike, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def ref_name(url: str, modified: int) -> str:
+        # the wstoken differs per user, the document does not
+        plain = httpx.URL(url).copy_remove_param("token")
+        return hashlib.sha256(f"{plain}\n{modified}".encode()).hexdigest()
+
+    @staticmethod
+    def reader(key: str, moodle_session: str) -> str:
+        return hashlib.sha256(f"{moodle_session}\n{key}".encode()).hexdigest()
+
+    def _dir(self, name: str) -> Path:
+        path = self.root / name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self._dir("tmp"))
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp, path)
+
+    def _read_ref(self, url: str, modified: int) -> dict | None:
+        try:
+            ref = self._dir("refs") / self.ref_name(url, modified)
+            return json.loads(ref.read_bytes())
+        except (OSError, ValueError):
+            return None
+
+    def _write_ref(
+        self, url: str, modified: int, entry: dict, reader: str | None
+    ) -> None:
+        readers = [r for r in entry.get("readers", []) if r != reader]
+        if reader is not None:
+            readers.append(reader)
+        entry["readers"] = readers[-self.max_readers :]
+        self._write_atomic(
+            self._dir("refs") / self.ref_name(url, modified),
+            json.dumps(entry).encode(),
+        )
+
+    async def lookup(
+        self, url: str, modified: int, reader: str | None = None
+    ) -> tuple[Path, str | None, bool] | None:
+        # the flag tells whether reader already got this file from moodle
+        return await asyncio.to_thread(self._lookup, url, modified, reader)
+
+    def _lookup(
+        self, url: str, modified: int, reader: str | None
+    ) -> tuple[Path, str | None, bool] | None:
+        entry = self._read_ref(url, modified)
+        try:
+            blob = self._dir("blobs") / entry["blob"]
+            # mtime doubles as the LRU clock
+            os.utime(blob)
+        except (OSError, TypeError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return blob, entry.get("content_type"), reader in entry.get("readers", [])
+
+    async def grant(self, url: str, modified: int, reader: str) -> None:
+        # moodle handed reader the file, later hits skip asking it again
+        await asyncio.to_thread(self._grant, url, modified, reader)
+
+    def _grant(self, url: str, modified: int, reader: str) -> None:
+        entry = self._read_ref(url, modified)
+        if entry is not None and reader not in entry.get("readers", []):
+            self._write_ref(url, modified, entry, reader)
+
+    async def save(
+        self,
+        url: str,
+        modified: int,
+        content_type: str | None,
+        chunks: AsyncIterator[bytes],
+        reader: str | None = None,
+    ) -> AsyncIterator[bytes]:
+        # disk work runs in worker threads, the event loop only relays chunks
+        file, tmp = await asyncio.to_thread(self._open_tmp)
+        digest = hashlib.sha256()
+        try:
+            with file:
+                async for chunk in chunks:
+                    await asyncio.to_thread(file.write, chunk)
+                    digest.update(chunk)
+                    yield chunk
+            await asyncio.to_thread(
+                self._commit,
+                tmp,
+                digest.hexdigest(),
+                url,
+                modified,
+                content_type,
+                reader,
+            )
+        except BaseException:
+            await asyncio.to_thread(self._discard, tmp)
+            raise
+        await asyncio.to_thread(self.evict)
+
+    def _open_tmp(self) -> tuple[BinaryIO, str]:
+        fd, tmp = tempfile.mkstemp(dir=self._dir("tmp"))
+        return os.fdopen(fd, "wb"), tmp
+
+    def _commit(
+        self,
+        tmp: str,
+        name: str,
+        url: str,
+        modified: int,
+        content_type: str | None,
+        reader: str | None,
+    ) -> None:
+        blob = self._dir("blobs") / name
+        if blob.exists():
+            os.unlink(tmp)
+            os.utime(blob)
+        else:
+            os.replace(tmp, blob)
+        entry = self._read_ref(url, modified) or {}
+        if entry.get("blob") != blob.name:
+            entry = {"blob": blob.name, "content_type": content_type}
+        self._write_ref(url, modified, entry, reader)
+
+    @staticmethod
+    def _discard(tmp: str) -> None:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+    def evict(self) -> None:
+        blobs = []
+        for entry in os.scandir(self._dir("blobs")):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            blobs.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in blobs)
+        for _, size, path in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        # refs to evicted blobs simply miss on the next lookup
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+document_store = (
+    DocumentStore(
+        os.path.join(settings.data_dir, "documents"), settings.doc_cache_max_bytes
+    )
+    if settings.doc_cache_enabled
+    else None
+)
@@ -1,18 +1,106 @@
+import asyncio
+import contextvars
 import http.cookiejar
-from typing import Annotated
+import os
+import struct
+import time
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Annotated, TypeVar
 
 import httpx
 from fastapi import Depends
-from fastapi.security import HTTPBearer
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.core.breaker import UpstreamUnavailable, breakers
+from app.core.cache import create_cache
+from app.core.codec import decode
+from app.core.config import settings
+from app.core.context import note_data_age
+from app.core.metrics import upstream_duration
+from app.core.retry import with_retry
+from app.core.sessions import EXPIRED_ERRORCODES, sessions
+from app.core.tracing import record
 
 security = HTTPBearer()
 
+T = TypeVar("T")
+
 
 class HTTPClientState:
     client: httpx.AsyncClient | None = None
 
 
+class SingleFlight:
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.collapsed += 1
+        # shielded so one cancelled caller does not cancel the shared request
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "collapsed": self.collapsed,
+        }
+
+
+# shared cache backends keep the status, content type and (already decoded)
+# body only, enough for the routes and without the wstoken in the request url
+frozen_head = struct.Struct("!HH")
+
+
+def freeze(response: httpx.Response) -> bytes:
+    content_type = response.headers.get("content-type", "").encode()
+    head = frozen_head.pack(response.status_code, len(content_type))
+    return head + content_type + response.content
+
+
+def thaw(data: bytes) -> httpx.Response:
+    status, length = frozen_head.unpack_from(data)
+    offset = frozen_head.size + length
+    return httpx.Response(
+        status,
+        headers={"content-type": data[frozen_head.size : offset].decode()},
+        content=data[offset:],
+    )
+
+
 http_state = HTTPClientState()
+response_cache = create_cache(
+    settings.cache_backend,
+    "responses",
+    settings.cache_max_entries,
+    freeze,
+    thaw,
+    path=settings.cache_db_path or os.path.join(settings.data_dir, "cache.db"),
+    url=settings.cache_redis_url,
+)
+inflight = SingleFlight()
+_refreshing: set[Hashable] = set()
+
+
+def _refreshed(key: Hashable, task: asyncio.Task) -> None:
+    _refreshing.discard(key)
+    if not task.cancelled():
+        task.exception()
 
 
 async def get_http_client():
@@ -30,3 +118,182 @@ class NullCookieJar(http.cookiejar.CookieJar):
 
 
 HTTPClientDep = Annotated[httpx.AsyncClient, Depends(get_http_client)]
+
+
+def upstream_endpoint(url: httpx.URL) -> str:
+    # pluginfile paths carry the file name, keep only the script
+    path = url.path.removeprefix(httpx.URL(settings.lms_url).path)
+    script, php, _ = path.partition(".php")
+    return script + php
+
+
+async def start_timer(request: httpx.Request) -> None:
+    request.extensions["started"] = time.perf_counter()
+
+
+async def observe_upstream(response: httpx.Response) -> None:
+    request = response.request
+    started = request.extensions["started"]
+    now = time.perf_counter()
+    labels = {
+        "endpoint": upstream_endpoint(request.url),
+        "wsfunction": request.url.params.get("wsfunction", ""),
+        "status": str(response.status_code),
+    }
+    upstream_duration.observe(now - started, **labels)
+    record("upstream", started, now, **labels)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        cookies=NullCookieJar(),
+        event_hooks={"request": [start_timer], "response": [observe_upstream]},
+        http2=settings.http2,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            connect=settings.http_connect_timeout,
+            read=settings.http_read_timeout,
+            write=settings.http_write_timeout,
+            pool=settings.http_pool_timeout,
+        ),
+    )
+
+
+async def warm_up(client: httpx.AsyncClient) -> None:
+    # open keep-alive connections before the first user request needs them
+    await asyncio.gather(
+        *(
+            client.head(settings.lms_url)
+            for _ in range(settings.http_warmup_connections)
+        ),
+        return_exceptions=True,
+    )
+
+
+def pool_stats() -> dict[str, int | float]:
+    pool = getattr(getattr(http_state.client, "_transport", None), "_pool", None)
+    if pool is None:
+        return {}
+    connections = pool.connections
+    requests = getattr(pool, "_requests", [])
+    idle = sum(1 for connection in connections if connection.is_idle())
+    waiting = sum(1 for request in requests if request.is_queued())
+    return {
+        "max_connections": settings.http_max_connections,
+        "connections": len(connections),
+        "idle": idle,
+        "active_requests": len(requests) - waiting,
+        "waiting_requests": waiting,
+        "saturation": round(
+            (len(connections) - idle) / settings.http_max_connections, 4
+        ),
+    }
+
+
+def is_expired(response: httpx.Response) -> bool:
+    return response.content.startswith(b'{"exception"') and (
+        decode(response).get("errorcode") in EXPIRED_ERRORCODES
+    )
+
+
+def is_cacheable(response: httpx.Response) -> bool:
+    # moodle reports webservice errors as a 200 with an exception object
+    return response.status_code == 200 and not response.content.startswith(
+        b'{"exception"'
+    )
+
+
+async def webservice(
+    client: httpx.AsyncClient,
+    key: str,
+    token: HTTPAuthorizationCredentials,
+    wsfunction: str,
+    refresh: bool = False,
+    **params: str,
+) -> httpx.Response:
+    # refresh skips the cached copy and replaces it with a fresh one
+    cache_key = (
+        wsfunction,
+        tuple(sorted(params.items())),
+        key,
+        token.credentials,
+        await sessions.generation(token.credentials),
+    )
+    max_stale = settings.cache_max_stale.get(wsfunction, 0)
+    lookup = settings.cache_enabled and not refresh
+    entry = await response_cache.lookup(cache_key) if lookup else None
+    if entry is not None and entry.fresh:
+        note_data_age(entry.age)
+        return entry.value
+
+    def fetch() -> Awaitable[httpx.Response]:
+        return with_retry(
+            lambda: breakers["server.php"].call(
+                lambda: client.get(
+                    url=f"{settings.lms_url}/webservice/rest/server.php",
+                    params={
+                        "wstoken": key,
+                        "moodlewsrestformat": "json",
+                        "wsfunction": wsfunction,
+                        **params,
+                    },
+                    headers={"Cookie": f"MoodleSession={token.credentials}"},
+                )
+            )
+        )
+
+    async def fetch_and_store() -> httpx.Response:
+        if settings.coalesce_enabled:
+            response = await inflight.do(cache_key, fetch)
+        else:
+            response = await fetch()
+        if is_expired(response):
+            # the next request resolves the keys again instead of reusing dead
+            # ones, and a dead session is not served what it saw before
+            await sessions.invalidate(token.credentials, key)
+            await response_cache.delete(cache_key)
+        if settings.cache_enabled and is_cacheable(response):
+            keep = max_stale and max(max_stale, settings.cache_stale_if_error)
+            await response_cache.set(
+                cache_key,
+                response,
+                settings.cache_ttl.get(wsfunction, settings.cache_default_ttl),
+                keep,
+            )
+        return response
+
+    if entry is not None and entry.stale_for <= max_stale:
+        # serve the last good payload now, refresh it behind the response
+        if cache_key not in _refreshing:
+            _refreshing.add(cache_key)
+            # detached from the request so its deadline does not cut the refresh short
+            task = asyncio.create_task(
+                fetch_and_store(), context=contextvars.Context()
+            )
+            task.add_done_callback(lambda done: _refreshed(cache_key, done))
+        response_cache.stale_hits += 1
+        note_data_age(entry.age)
+        return entry.value
+
+    serve_on_error = entry is not None and max_stale > 0
+    try:
+        response = await fetch_and_store()
+    except UpstreamUnavailable:
+        # an open circuit falls back to whatever is still cached
+        if entry is None:
+            raise
+        response = None
+        serve_on_error = True
+    except (httpx.TimeoutException, httpx.TransportError):
+        if not serve_on_error:
+            raise
+        response = None
+    if serve_on_error and (response is None or response.status_code >= 500):
+        response_cache.stale_hits += 1
+        note_data_age(entry.age)
+        return entry.value
+    return response
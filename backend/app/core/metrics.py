@@ -0,0 +1,217 @@
+import abc
+import bisect
+import math
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from typing import TypeVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = tuple[str, ...]
+M = TypeVar("M", bound="Metric")
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names: Labels, values: Labels, *extra: tuple[str, str]) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+
+    def key(self, labels: dict[str, str]) -> Labels:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[str]: ...
+
+    def render(self) -> str:
+        return "\n".join([
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ])
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Labels = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # per label set: non-cumulative bucket counts (last one is +Inf), sum
+        self._series: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = format_labels(self.labels, key, ("le", format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labels, key)
+            yield f"{self.name}_sum{labels} {format_value(total[0])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class StatsCollector(Metric):
+    # exports the numeric fields of existing stats() dicts as gauges at scrape time
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        collect: Callable[[], dict[Labels, dict]],
+        labels: Labels = (),
+    ):
+        super().__init__(name, help, labels)
+        self.collect = collect
+
+    def fields(self) -> dict[str, list[str]]:
+        # one gauge family per numeric field
+        fields: dict[str, list[str]] = {}
+        for key, stats in sorted(self.collect().items()):
+            for field, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, int | float):
+                    continue
+                fields.setdefault(field, []).append(
+                    f"{self.name}_{field}{format_labels(self.labels, key)} "
+                    f"{format_value(value)}"
+                )
+        return fields
+
+    def samples(self) -> Iterator[str]:
+        for samples in self.fields().values():
+            yield from samples
+
+    def render(self) -> str:
+        return "\n".join(
+            "\n".join([
+                f"# HELP {self.name}_{field} {self.help} ({field})",
+                f"# TYPE {self.name}_{field} {self.kind}",
+                *samples,
+            ])
+            for field, samples in self.fields().items()
+        )
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        rendered = (metric.render() for metric in self.metrics)
+        return "\n".join(filter(None, rendered)) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.register(
+    Histogram(
+        "mydylms_http_request_duration_seconds",
+        "Time spent handling API requests",
+        ("method", "route", "status"),
+    )
+)
+response_size = registry.register(
+    Histogram(
+        "mydylms_http_response_size_bytes",
+        "Size of API response bodies",
+        ("method", "route"),
+        SIZE_BUCKETS,
+    )
+)
+requests_in_flight = registry.register(
+    Gauge("mydylms_http_requests_in_flight", "API requests currently being handled")
+)
+upstream_duration = registry.register(
+    Histogram(
+        "mydylms_upstream_request_duration_seconds",
+        "Time until the LMS answered with response headers",
+        ("endpoint", "wsfunction", "status"),
+    )
+)
+validation_duration = registry.register(
+    Histogram(
+        "mydylms_validation_duration_seconds",
+        "Time spent validating upstream data into pydantic models",
+        ("model",),
+        (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+    )
+)
@@ -0,0 +1,190 @@
+import hashlib
+import math
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.context import RequestState, request_state
+from app.core.metrics import request_duration, requests_in_flight, response_size
+from app.core.tracing import Trace, current_trace, finish
+
+
+def cache_control_for(path: str) -> str:
+    # matched against the route template, so entries can name path parameters
+    prefixes = [prefix for prefix in settings.cache_control if path.startswith(prefix)]
+    if not prefixes:
+        return settings.cache_control_default
+    return settings.cache_control[max(prefixes, key=len)]
+
+
+def request_budget(scope: Scope) -> float:
+    # clients may ask for a tighter budget than the server default; anything
+    # but a positive finite number of seconds is ignored
+    try:
+        requested = float(Headers(scope=scope).get("x-request-timeout", "inf"))
+    except ValueError:
+        requested = float("inf")
+    if not math.isfinite(requested) or requested <= 0:
+        return settings.request_deadline
+    return min(requested, settings.request_deadline)
+
+
+def route_template(scope: Scope) -> str:
+    # put the parameter names back so ids in paths do not explode the label space
+    if scope.get("route") is None:
+        return "unmatched"
+    path = scope["path"]
+    for name, value in reversed(scope.get("path_params", {}).items()):
+        head, found, tail = path.rpartition(str(value))
+        if found:
+            path = f"{head}{{{name}}}{tail}"
+    return path
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+class ETagMiddleware:
+    # buffers JSON GET responses to hash them; streams and files pass through
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Message | None = None
+        chunks: list[bytes] = []
+
+        async def send_with_etag(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    message["status"] == 200
+                    and "etag" not in headers
+                    and headers.get("content-type", "").startswith("application/json")
+                ):
+                    start = message
+                    return
+            elif message["type"] == "http.response.body" and start is not None:
+                chunks.append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                body = b"".join(chunks)
+                etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+                headers = MutableHeaders(scope=start)
+                headers["etag"] = etag
+                headers["cache-control"] = cache_control_for(route_template(scope))
+                headers.add_vary_header("Authorization")
+                headers.add_vary_header("X-API-Key")
+                headers.add_vary_header("X-User-Id")
+                if etag_matches(if_none_match, etag):
+                    start["status"] = 304
+                    del headers["content-length"]
+                    del headers["content-type"]
+                    body = b""
+                await send(start)
+                await send({"type": "http.response.body", "body": body})
+                return
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+
+class TracingMiddleware:
+    # collects spans for the request, keeps slow traces and can report the
+    # spans back to the client as a Server-Timing header
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.trace_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(method=scope["method"], path=scope["path"])
+        reset = current_trace.set(trace)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                if settings.server_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers["server-timing"] = trace.server_timing()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_trace.reset(reset)
+            finish(trace, trace.status)
+
+
+class RequestStateMiddleware:
+    # request-scoped state for code below the route, surfaced as headers
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = RequestState(deadline=time.monotonic() + request_budget(scope))
+        reset = request_state.set(state)
+
+        async def send_with_state(message: Message) -> None:
+            if message["type"] == "http.response.start" and state.data_age is not None:
+                MutableHeaders(scope=message)["age"] = str(int(state.data_age))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_state)
+        finally:
+            request_state.reset(reset)
+
+
+class MetricsMiddleware:
+    # outermost, so sizes and statuses are what the client actually received
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            requests_in_flight.dec()
+            route = route_template(scope)
+            request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=route,
+                status=str(status),
+            )
+            response_size.observe(size, method=scope["method"], route=route)
@@ -0,0 +1,85 @@
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+
+import httpx
+
+from app.core.config import settings
+from app.core.context import request_state
+
+RETRY_STATUSES = {502, 503, 504}
+RETRY_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.ReadError,
+    httpx.RemoteProtocolError,
+)
+
+
+class RetryStats:
+    def __init__(self):
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.deadline_exceeded = 0
+
+    def stats(self) -> dict[str, int]:
+        return dict(vars(self))
+
+
+retry_stats = RetryStats()
+
+
+def remaining_budget() -> float | None:
+    state = request_state.get()
+    if state is None or state.deadline is None:
+        return None
+    return state.deadline - time.monotonic()
+
+
+def backoff(attempt: int) -> float:
+    # full jitter keeps a burst of failing callers from retrying in lockstep
+    ceiling = min(settings.retry_backoff_max, settings.retry_backoff_base * 2**attempt)
+    return random.uniform(0, ceiling)
+
+
+async def with_retry(fn: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+    # only for idempotent GETs, never login/logout
+    retry_stats.calls += 1
+    for attempt in range(settings.retry_attempts):
+        remaining = remaining_budget()
+        if remaining is not None and remaining <= 0:
+            retry_stats.deadline_exceeded += 1
+            raise httpx.TimeoutException("request deadline exceeded")
+        retry_stats.attempts += 1
+        last_attempt = attempt == settings.retry_attempts - 1
+        try:
+            response = await asyncio.wait_for(fn(), remaining)
+        except TimeoutError:
+            retry_stats.deadline_exceeded += 1
+            raise httpx.TimeoutException("request deadline exceeded") from None
+        except RETRY_ERRORS:
+            if last_attempt:
+                retry_stats.exhausted += 1
+                raise
+            response = None
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if last_attempt:
+                retry_stats.exhausted += 1
+                return response
+
+        delay = backoff(attempt)
+        remaining = remaining_budget()
+        if remaining is not None and delay >= remaining:
+            # no budget left for another attempt, surface what we have
+            retry_stats.deadline_exceeded += 1
+            if response is None:
+                raise httpx.TimeoutException("request deadline exceeded")
+            return response
+        retry_stats.retries += 1
+        await asyncio.sleep(delay)
+    raise RuntimeError("retry_attempts must be at least 1")
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+from app.core.config import settings
+from app.core.utils import owner_digest
+from app.schemas.content import WeekBase
+
+T = TypeVar("T")
+
+SORTS = {
+    "relevance": "rank",
+    "newest": "modified_at DESC",
+    "oldest": "modified_at ASC",
+}
+
+
+class SearchIndex:
+    # one index per owner (a digest of the API key), moodle can hide modules
+    # from some users of a course and each must only find what they can see
+    schema_version = 1
+    busy_timeout = 1
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # workers share the file, WAL keeps their reads off each other's writes
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        with self.db:
+            version = self.db.execute("PRAGMA user_version").fetchone()[0]
+            if version < self.schema_version:
+                # courses are indexed again on the next search
+                self.db.execute("DROP TABLE IF EXISTS courses")
+                self.db.execute("DROP TABLE IF EXISTS docs")
+                self.db.execute(f"PRAGMA user_version = {self.schema_version}")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS courses (
+                owner TEXT NOT NULL,
+                course_id INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                indexed_at REAL NOT NULL,
+                PRIMARY KEY (owner, course_id)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+                doc_title,
+                module_title,
+                week_title,
+                teacher_name,
+                owner UNINDEXED,
+                course_id UNINDEXED,
+                week_id UNINDEXED,
+                module_id UNINDEXED,
+                module_type UNINDEXED,
+                doc_type UNINDEXED,
+                doc_url UNINDEXED,
+                doc_size UNINDEXED,
+                created_at UNINDEXED,
+                modified_at UNINDEXED,
+                prefix = '2 3',
+                tokenize = 'unicode61 remove_diacritics 2'
+            );
+            """
+        )
+        self.db.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+
+    def _locked(self, method: Callable[..., T], *args) -> T:
+        with self.lock:
+            return method(*args)
+
+    async def stale(
+        self, key: str, course_ids: list[int], max_age: float
+    ) -> list[int]:
+        return await asyncio.to_thread(
+            self._locked, self._stale, key, course_ids, max_age
+        )
+
+    async def index_course(
+        self, key: str, course_id: int, digest: str, weeks: list[WeekBase]
+    ) -> bool:
+        # in a worker thread, off the event loop. Still locked out after the
+        # busy timeout, the course stays as it was and is indexed on a later
+        # fetch
+        try:
+            return await asyncio.to_thread(
+                self._locked, self._index_course, key, course_id, digest, weeks
+            )
+        except sqlite3.OperationalError:
+            return False
+
+    async def search(
+        self,
+        key: str,
+        query: str,
+        course_ids: list[int],
+        doc_type: str | None = None,
+        module_type: str | None = None,
+        sort: str = "relevance",
+        limit: int = 50,
+    ) -> list[dict]:
+        return await asyncio.to_thread(
+            self._locked,
+            self._search,
+            key,
+            query,
+            course_ids,
+            doc_type,
+            module_type,
+            sort,
+            limit,
+        )
+
+    def _stale(self, key: str, course_ids: list[int], max_age: float) -> list[int]:
+        indexed = {
+            row["course_id"]: row["indexed_at"]
+            for row in self.db.execute(
+                "SELECT course_id, indexed_at FROM courses WHERE owner = ?",
+                (owner_digest(key),),
+            )
+        }
+        now = time.time()
+        return [id for id in course_ids if now - indexed.get(id, 0) > max_age]
+
+    def _index_course(
+        self, key: str, course_id: int, digest: str, weeks: list[WeekBase]
+    ) -> bool:
+        owner = owner_digest(key)
+        with self.db:
+            row = self.db.execute(
+                "SELECT digest FROM courses WHERE owner = ? AND course_id = ?",
+                (owner, course_id),
+            ).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO courses VALUES (?, ?, ?, ?)",
+                (owner, course_id, digest, time.time()),
+            )
+            if row is not None and row["digest"] == digest:
+                return False
+            self.db.execute(
+                "DELETE FROM docs WHERE owner = ? AND course_id = ?",
+                (owner, course_id),
+            )
+            self.db.executemany(
+                "INSERT INTO docs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        doc.doc_title,
+                        module.module_title,
+                        week.week_title,
+                        doc.teacher_name,
+                        owner,
+                        course_id,
+                        week.week_id,
+                        module.module_id,
+                        module.module_type,
+                        doc.doc_type,
+                        doc.doc_url,
+                        doc.doc_size,
+                        doc.created_at,
+                        doc.modified_at,
+                    )
+                    for week in weeks
+                    for module in week.modules
+                    for doc in module.docs
+                ],
+            )
+        return True
+
+    @staticmethod
+    def match_expression(query: str) -> str:
+        # every word must match, as a prefix, in any indexed column
+        return " ".join(f'"{word}"*' for word in re.findall(r"\w+", query))
+
+    def _search(
+        self,
+        key: str,
+        query: str,
+        course_ids: list[int],
+        doc_type: str | None = None,
+        module_type: str | None = None,
+        sort: str = "relevance",
+        limit: int = 50,
+    ) -> list[dict]:
+        clauses = [
+            "owner = ?",
+            f"course_id IN ({', '.join('?' * len(course_ids))})",
+        ]
+        params: list = [owner_digest(key), *course_ids]
+        if match := self.match_expression(query):
+            clauses.append("docs MATCH ?")
+            params.append(match)
+        if doc_type:
+            clauses.append("doc_type = ?")
+            params.append(doc_type)
+        if module_type:
+            clauses.append("module_type = ?")
+            params.append(module_type)
+        if match:
+            rank = "bm25(docs, 10.0, 5.0, 2.0, 1.0)"
+            order = SORTS[sort]
+        else:
+            rank = "0.0"
+            order = SORTS["oldest" if sort == "oldest" else "newest"]
+        rows = self.db.execute(
+            f"""
+            SELECT *, {rank} AS rank FROM docs
+            WHERE {" AND ".join(clauses)}
+            ORDER BY {order}
+            LIMIT ?
+            """,
+            (*params, limit),
+        )
+        return [dict(row) for row in rows]
+
+
+search_index = SearchIndex(
+    settings.search_db_path or os.path.join(settings.data_dir, "search.db")
+)
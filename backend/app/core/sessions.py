@@ -0,0 +1,97 @@
+import json
+import os
+import secrets
+from dataclasses import asdict, dataclass, field, replace
+
+from app.core.cache import create_cache
+from app.core.config import settings
+
+# moodle errorcodes that mean the wstoken or the MoodleSession behind it is gone
+EXPIRED_ERRORCODES = {"invalidtoken", "requireloginerror", "servicerequireslogin"}
+
+
+@dataclass
+class Session:
+    user_id: str | None = None
+    session_key: str | None = None
+    # web service, features and service keys, in managetoken.php order
+    keys: list[str | None] = field(default_factory=list)
+    # folded into response cache keys, a new one orphans everything cached
+    # under the old
+    generation: str | None = None
+
+    @property
+    def api_key(self) -> str | None:
+        # what clients send as X-API-Key
+        return self.keys[1] if len(self.keys) > 1 else None
+
+
+def dumps(session: Session) -> bytes:
+    return json.dumps(asdict(session)).encode()
+
+
+def loads(data: bytes) -> Session:
+    return Session(**json.loads(data))
+
+
+def new_generation() -> str:
+    return secrets.token_hex(8)
+
+
+class SessionRegistry:
+    # keyed by MoodleSession, in the same backend as the response cache so
+    # every worker sees a session another one resolved
+    def __init__(self):
+        self.store = create_cache(
+            settings.cache_backend,
+            "sessions",
+            settings.session_max_entries,
+            dumps,
+            loads,
+            path=settings.cache_db_path or os.path.join(settings.data_dir, "cache.db"),
+            url=settings.cache_redis_url,
+        )
+        self.invalidations = 0
+
+    async def get(self, moodle_session: str) -> Session | None:
+        return await self.store.get(moodle_session)
+
+    async def update(
+        self, moodle_session: str, ttl: float | None = None, **values
+    ) -> Session:
+        session = replace(await self.get(moodle_session) or Session(), **values)
+        await self.store.set(moodle_session, session, ttl or settings.session_ttl)
+        return session
+
+    async def generation(self, moodle_session: str) -> str | None:
+        session = await self.get(moodle_session)
+        return session.generation if session is not None else None
+
+    async def invalidate(self, moodle_session: str, key: str | None = None) -> None:
+        # a rejected key only drops the keys, so the next request scrapes them
+        # again; and only the key on record, a client sending a wrong key of
+        # its own must not cost a good session. Without a key (logout) the
+        # whole session goes, only a new generation stays behind, for as long
+        # as anything cached under the old one could still be served
+        if key is None:
+            await self.store.set(
+                moodle_session,
+                Session(generation=new_generation()),
+                max(
+                    settings.session_ttl,
+                    settings.cache_stale_if_error,
+                    *settings.cache_max_stale.values(),
+                ),
+            )
+            self.invalidations += 1
+            return
+        session = await self.get(moodle_session)
+        if session is not None and key in session.keys:
+            await self.update(moodle_session, keys=[])
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {**self.store.stats(), "invalidations": self.invalidations}
+
+
+sessions = SessionRegistry()
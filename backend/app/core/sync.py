@@ -0,0 +1,233 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from typing import TypeVar
+
+import httpx
+
+from app.core.config import settings
+from app.core.utils import owner_digest
+from app.schemas.content import WeekBase
+
+T = TypeVar("T")
+
+
+def doc_records(weeks: list[WeekBase]) -> dict[str, dict]:
+    records = {}
+    for week in weeks:
+        for module in week.modules:
+            for doc in module.docs:
+                # wstoken aside, the url identifies a file; fall back for links
+                key = (
+                    str(httpx.URL(doc.doc_url).copy_remove_param("token"))
+                    if doc.doc_url
+                    else f"{module.module_id}/{doc.doc_title}"
+                )
+                records[key] = {
+                    "week_id": week.week_id,
+                    "week_title": week.week_title,
+                    "module_id": module.module_id,
+                    "module_title": module.module_title,
+                    "module_type": module.module_type,
+                    **doc.model_dump(),
+                }
+    return records
+
+
+class ContentSync:
+    # snapshots are kept per owner (a digest of the API key): moodle can show
+    # each user a different set of restricted modules, a shared snapshot would
+    # flip those between added and removed as the users take turns
+    schema_version = 1
+    busy_timeout = 1
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # workers share the file, WAL keeps their reads off each other's writes
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.db.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        with self.db:
+            version = self.db.execute("PRAGMA user_version").fetchone()[0]
+            if version < self.schema_version:
+                # snapshots rebuild themselves on the next fetch
+                self.db.execute("DROP TABLE IF EXISTS snapshots")
+                self.db.execute("DROP TABLE IF EXISTS docs")
+                self.db.execute(f"PRAGMA user_version = {self.schema_version}")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS snapshots (
+                owner TEXT NOT NULL,
+                course_id INTEGER NOT NULL,
+                digest TEXT NOT NULL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (owner, course_id)
+            );
+            CREATE TABLE IF NOT EXISTS docs (
+                owner TEXT NOT NULL,
+                course_id INTEGER NOT NULL,
+                doc_key TEXT NOT NULL,
+                record TEXT NOT NULL,
+                added_at REAL NOT NULL,
+                changed_at REAL,
+                removed_at REAL,
+                PRIMARY KEY (owner, course_id, doc_key)
+            );
+            CREATE INDEX IF NOT EXISTS docs_added ON docs (owner, added_at);
+            CREATE INDEX IF NOT EXISTS docs_changed ON docs (owner, changed_at);
+            CREATE INDEX IF NOT EXISTS docs_removed ON docs (owner, removed_at);
+            """
+        )
+        self.db.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+
+    def _locked(self, method: Callable[..., T], *args) -> T:
+        with self.lock:
+            return method(*args)
+
+    async def sync(
+        self, key: str, course_id: int, digest: str, weeks: list[WeekBase]
+    ) -> bool:
+        # in a worker thread, off the event loop. Still locked out after the
+        # busy timeout, this round is skipped: the snapshot rolled back with
+        # it, so the next fetch diffs again
+        try:
+            return await asyncio.to_thread(
+                self._locked, self._sync, key, course_id, digest, weeks
+            )
+        except sqlite3.OperationalError:
+            return False
+
+    async def changes(
+        self,
+        key: str,
+        course_ids: list[int],
+        since: float,
+        limit: int | None = None,
+    ) -> dict:
+        return await asyncio.to_thread(
+            self._locked, self._changes, key, course_ids, since, limit
+        )
+
+    def _sync(
+        self, key: str, course_id: int, digest: str, weeks: list[WeekBase]
+    ) -> bool:
+        now = time.time()
+        owner = owner_digest(key)
+        with self.db:
+            snapshot = self.db.execute(
+                "SELECT digest FROM snapshots WHERE owner = ? AND course_id = ?",
+                (owner, course_id),
+            ).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+                (owner, course_id, digest, now),
+            )
+            if snapshot is not None and snapshot["digest"] == digest:
+                return False
+
+            known = {
+                row["doc_key"]: row
+                for row in self.db.execute(
+                    "SELECT doc_key, record, removed_at FROM docs"
+                    " WHERE owner = ? AND course_id = ?",
+                    (owner, course_id),
+                )
+            }
+            records = doc_records(weeks)
+            for doc_key, record in records.items():
+                payload = json.dumps(record, sort_keys=True)
+                row = known.get(doc_key)
+                if row is None or row["removed_at"] is not None:
+                    # the first snapshot dates docs by upstream timestamps,
+                    # later ones by when the doc showed up
+                    added_at = (
+                        now
+                        if snapshot is not None
+                        else record["created_at"] or record["modified_at"] or now
+                    )
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO docs"
+                        " VALUES (?, ?, ?, ?, ?, NULL, NULL)",
+                        (owner, course_id, doc_key, payload, added_at),
+                    )
+                elif row["record"] != payload:
+                    self.db.execute(
+                        "UPDATE docs SET record = ?, changed_at = ?"
+                        " WHERE owner = ? AND course_id = ? AND doc_key = ?",
+                        (payload, now, owner, course_id, doc_key),
+                    )
+            self.db.executemany(
+                "UPDATE docs SET removed_at = ?"
+                " WHERE owner = ? AND course_id = ? AND doc_key = ?",
+                [
+                    (now, owner, course_id, doc_key)
+                    for doc_key, row in known.items()
+                    if doc_key not in records and row["removed_at"] is None
+                ],
+            )
+        return True
+
+    def _changes(
+        self,
+        key: str,
+        course_ids: list[int],
+        since: float,
+        limit: int | None = None,
+    ) -> dict:
+        # oldest first, so a client following the until cursor gets every
+        # change. With more than limit changes of a kind, until stops at the
+        # limit-th one and has_more is set; rows sharing that timestamp are
+        # never split across pages (a sync stamps all its rows alike), so a
+        # page can run past limit
+        owner = owner_digest(key)
+        placeholders = ", ".join("?" * len(course_ids))
+        kinds = (
+            ("added", "added_at", "removed_at IS NULL"),
+            ("modified", "changed_at", "removed_at IS NULL"),
+            ("removed", "removed_at", "1"),
+        )
+        until, has_more = time.time(), False
+        for _, column, extra in kinds if limit is not None else ():
+            cut = self.db.execute(
+                f"""
+                SELECT {column} FROM docs
+                WHERE owner = ? AND course_id IN ({placeholders})
+                AND {column} > ? AND {column} <= ? AND {extra}
+                ORDER BY {column} LIMIT 2 OFFSET ?
+                """,
+                (owner, *course_ids, since, until, limit - 1),
+            ).fetchall()
+            if len(cut) == 2:
+                until, has_more = cut[0][0], True
+        result = {"until": until, "has_more": has_more}
+        for kind, column, extra in kinds:
+            rows = self.db.execute(
+                f"""
+                SELECT course_id, record, {column} AS changed_at FROM docs
+                WHERE owner = ? AND course_id IN ({placeholders})
+                AND {column} > ? AND {column} <= ? AND {extra}
+                ORDER BY {column}
+                """,
+                (owner, *course_ids, since, until),
+            ).fetchall()
+            result[kind] = [
+                {
+                    "course_id": row["course_id"],
+                    "changed_at": row["changed_at"],
+                    **json.loads(row["record"]),
+                }
+                for row in rows
+            ]
+        return result
+
+
+content_sync = ContentSync(
+    settings.sync_db_path or os.path.join(settings.data_dir, "sync.db")
+)
@@ -0,0 +1,145 @@
+import functools
+import inspect
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+
+
+@dataclass
+class Span:
+    name: str
+    # seconds since the start of the request
+    start: float
+    duration: float
+    attrs: dict[str, Any]
+
+
+@dataclass
+class Trace:
+    method: str
+    path: str
+    started_at: float = field(default_factory=time.time)
+    origin: float = field(default_factory=time.perf_counter)
+    status: int | None = None
+    duration: float = 0.0
+    spans: list[Span] = field(default_factory=list)
+    endpoint_done: float | None = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "spans": [
+                {
+                    "name": span.name,
+                    "start_ms": round(span.start * 1000, 3),
+                    "duration_ms": round(span.duration * 1000, 3),
+                    **span.attrs,
+                }
+                for span in self.spans
+            ],
+        }
+
+    def server_timing(self) -> str:
+        # one entry per span name, repeated spans (e.g. upstream) are summed
+        totals: dict[str, float] = {}
+        for span in self.spans:
+            totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        totals["total"] = time.perf_counter() - self.origin
+        return ", ".join(
+            f"{name};dur={duration * 1000:.1f}" for name, duration in totals.items()
+        )
+
+
+current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+slow_traces: deque[Trace] = deque(maxlen=settings.trace_buffer_size)
+
+
+def record(name: str, start: float, end: float, **attrs: Any) -> None:
+    trace = current_trace.get()
+    if trace is not None:
+        trace.spans.append(Span(name, start - trace.origin, end - start, attrs))
+
+
+@contextmanager
+def span(
+    name: str, histogram: Histogram | None = None, **attrs: str
+) -> Iterator[None]:
+    # optionally feeds a histogram labelled with the span attributes as well
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if histogram is not None:
+            histogram.observe(end - start, **attrs)
+        record(name, start, end, **attrs)
+
+
+def finish(trace: Trace, status: int | None) -> None:
+    trace.status = status
+    trace.duration = time.perf_counter() - trace.origin
+    if trace.duration >= settings.trace_slow_threshold:
+        slow_traces.append(trace)
+
+
+def traced(endpoint: Callable) -> Callable:
+    if inspect.iscoroutinefunction(endpoint):
+
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                with span("endpoint"):
+                    return await endpoint(*args, **kwargs)
+            finally:
+                mark_endpoint_done()
+
+    else:
+
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                with span("endpoint"):
+                    return endpoint(*args, **kwargs)
+            finally:
+                mark_endpoint_done()
+
+    return wrapper
+
+
+def mark_endpoint_done() -> None:
+    trace = current_trace.get()
+    if trace is not None:
+        trace.endpoint_done = time.perf_counter()
+
+
+class TracedRoute(APIRoute):
+    # fastapi validates and serializes the response_model after the endpoint
+    # returns, the gap up to the finished response is the serialize span
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, traced(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def traced_handler(request: Request) -> Response:
+            response = await handler(request)
+            trace = current_trace.get()
+            if trace is not None and trace.endpoint_done is not None:
+                record("serialize", trace.endpoint_done, time.perf_counter())
+            return response
+
+        return traced_handler
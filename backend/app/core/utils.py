@@ -1,5 +1,11 @@
+import hashlib
 import os
 import sys
+from collections.abc import AsyncIterable
+
+from pydantic import BaseModel
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
 
 def static_path() -> str:
@@ -11,3 +17,18 @@ def static_path() -> str:
     else:
         base_dir = os.path.dirname(sys.executable)
     return os.path.join(base_dir, "static")
+
+
+def owner_digest(key: str) -> str:
+    # stands in for a user in the local indexes, the key itself is a credential
+    # and never written out
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def accepts_ndjson(accept: str | None) -> bool:
+    return accept is not None and NDJSON_MEDIA_TYPE in accept
+
+
+async def ndjson_lines(records: AsyncIterable[BaseModel]):
+    async for record in records:
+        yield record.model_dump_json() + "\n"
@@ -1,27 +1,71 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
 import httpx
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi_mcp import FastApiMCP
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 
 from app.core.config import settings
-from app.core.http import NullCookieJar, http_state
+from app.core.http import create_http_client, http_state, warm_up
+from app.core.middleware import (
+    ETagMiddleware,
+    MetricsMiddleware,
+    RequestStateMiddleware,
+    TracingMiddleware,
+)
 from app.core.utils import static_path
-from app.routes import annoucement, attendance, auth, calendar, content, system, user
+from app.services.poller import pollers
+from app.routes import (
+    annoucement,
+    attendance,
+    auth,
+    calendar,
+    content,
+    dashboard,
+    system,
+    user,
+)
+
+
+class MCPTransport:
+    # MCP over streamable HTTP from a session manager the app owns, started
+    # with the lifespan; fastapi-mcp's own starts on the first request, which
+    # races under load. MCP sessions live in process memory, so with several
+    # workers (each request may land on another one) every call is stateless
+    manager: StreamableHTTPSessionManager | None = None
+
+    @asynccontextmanager
+    async def run(self):
+        self.manager = StreamableHTTPSessionManager(
+            app=mcp.server,
+            json_response=True,
+            stateless=settings.workers > 1,
+        )
+        async with self.manager.run():
+            yield
+
+    async def __call__(self, scope, receive, send):
+        await self.manager.handle_request(scope, receive, send)
+
+
+mcp_transport = MCPTransport()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    http_state.client = httpx.AsyncClient(
-        cookies=NullCookieJar(),
-    )
-    yield
+    http_state.client = create_http_client()
+    warmup = asyncio.create_task(warm_up(http_state.client))
+    async with mcp_transport.run():
+        yield
+    await pollers.close()
     # Shutdown
+    warmup.cancel()
     await http_state.client.aclose()
 
 
@@ -32,12 +76,27 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+
+@app.exception_handler(httpx.TimeoutException)
+async def upstream_timeout(request: Request, exc: httpx.TimeoutException):
+    # the LMS was too slow, or the request deadline ran out before it answered
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"detail": str(exc) or "upstream timed out"},
+    )
+
+
 app.add_middleware(
     middleware_class=CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Age", "ETag", "Server-Timing"],
 )
+app.add_middleware(middleware_class=ETagMiddleware)
+app.add_middleware(middleware_class=TracingMiddleware)
+app.add_middleware(middleware_class=RequestStateMiddleware)
+app.add_middleware(middleware_class=MetricsMiddleware)
 
 static_dir = static_path()
 
@@ -52,6 +111,9 @@ app.include_router(
     router=annoucement.router, prefix="/v1/annoucement", tags=["annoucement"]
 )
 app.include_router(router=calendar.router, prefix="/v1/calendar", tags=["calendar"])
+app.include_router(
+    router=dashboard.router, prefix="/v1/dashboard", tags=["dashboard"]
+)
 
 mcp = FastApiMCP(
     app,
@@ -63,14 +125,18 @@ mcp = FastApiMCP(
         "get_current_semester_courses",
         "get_enrolled_courses",
         "get_course_docs",
+        "get_all_course_docs",
+        "search_course_docs",
+        "get_content_changes",
         "get_calendar_events",
         "get_all_announcements",
         "fetch_latest_annoucements",
         "get_attendance",
+        "get_dashboard",
     ],
     headers=["authorization", "x-user-id", "x-api-key"],
 )
-mcp.mount_http()
+app.add_route("/mcp", mcp_transport, methods=["GET", "POST", "DELETE"])
 
 print(
     f"static_dir -> {static_dir} | exists? -> {os.path.isdir(static_dir)} | index.html exists? -> {os.path.isfile(os.path.join(static_dir, 'index.html'))}"
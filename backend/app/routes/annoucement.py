@@ -1,13 +1,21 @@
+import asyncio
+from collections.abc import AsyncIterator
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials
 
-from app.core.http import HTTPClientDep, security
+from app.core.codec import decode, respond
+from app.core.config import settings
+from app.core.http import HTTPClientDep, is_cacheable, security
+from app.core.tracing import TracedRoute
 from app.schemas.announcement import AnnouncementBase
 from app.services.annoucements import annoucement, annoucement_all
+from app.services.poller import AnnouncementPoller, pollers
+from app.services.user import ApiKeyDep, UserIdDep
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 @router.get(
@@ -19,14 +27,14 @@ router = APIRouter()
 async def fetch_annoucements(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-    user_id: str = Header(..., alias="x-user-id"),
-    key: str = Header(..., alias="X-API-Key"),
+    user_id: UserIdDep,
+    key: ApiKeyDep,
 ):
     try:
         response = await annoucement(user_id, key, token, client)
 
         if response.status_code == 200:
-            return response.json()
+            return respond(list[AnnouncementBase], decode(response))
     except HTTPException:
         raise
 
@@ -40,13 +48,55 @@ async def fetch_annoucements(
 async def fetch_all_annoucements(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-    user_id: str = Header(..., alias="x-user-id"),
-    key: str = Header(..., alias="X-API-Key"),
+    user_id: UserIdDep,
+    key: ApiKeyDep,
 ):
     try:
         response = await annoucement_all(user_id, key, token, client)
 
         if response.status_code == 200:
-            return response.json()
+            return respond(list[AnnouncementBase], decode(response))
     except HTTPException:
         raise
+
+
+async def event_stream(
+    poller: AnnouncementPoller, queue: asyncio.Queue[bytes | None]
+) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), settings.sse_keepalive)
+            except TimeoutError:
+                # keeps proxies from closing an idle stream
+                yield b": keepalive\n\n"
+                continue
+            if event is None:
+                return
+            yield event
+    finally:
+        poller.unsubscribe(queue)
+
+
+@router.get("/stream", status_code=status.HTTP_200_OK)
+async def stream_annoucements(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    user_id: UserIdDep,
+    key: ApiKeyDep,
+):
+    # server-sent events with only the posts that are new since the stream
+    # opened, fetch /v1/annoucement for the current list
+    response = await annoucement(user_id, key, token, client)
+    # a poller only ever runs on credentials moodle accepted
+    if not is_cacheable(response):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="unable to fetch announcements",
+        )
+    poller, queue = pollers.subscribe(user_id, key, token, client)
+    return StreamingResponse(
+        event_stream(poller, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
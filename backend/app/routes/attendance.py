@@ -1,13 +1,16 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
 
+from app.core.codec import decode, respond
 from app.core.http import HTTPClientDep, security
+from app.core.tracing import TracedRoute
 from app.schemas.attendance import SubAttendance
 from app.services.attendance import attendance
+from app.services.user import ApiKeyDep, UserIdDep
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 @router.get(
@@ -19,13 +22,13 @@ router = APIRouter()
 async def fetch_attentdance(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-    user_id: str = Header(..., alias="x-user-id"),
-    key: str = Header(..., alias="X-API-Key"),
+    user_id: UserIdDep,
+    key: ApiKeyDep,
 ):
     try:
         response = await attendance(key, user_id, token, client)
         if response.status_code == 200:
-            return response.json()
+            return respond(list[SubAttendance], decode(response))
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
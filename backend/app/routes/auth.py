@@ -1,40 +1,49 @@
-import re
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, OAuth2PasswordRequestForm
 
 from app.core.http import HTTPClientDep, security
+from app.core.sessions import new_generation, sessions
+from app.core.tracing import TracedRoute
 from app.schemas.auth import LoginResponse
 from app.services.auth import (
+    LOGIN_FAILED,
+    LOGIN_SUCCEEDED,
+    SESSKEY_PATTERN,
+    USER_ID_PATTERN,
     login,
     logout,
 )
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 @router.post("/login", response_model=LoginResponse, status_code=201)
-async def auth_login(user_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
+async def auth_login(
+    user_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    client: HTTPClientDep,
+):
     try:
-        response, moodle_session = await login(user_data.username, user_data.password)
-        if (
-            "Invalid login, please try again" in response.text
-            or "Academic Status" not in response.text
-        ):
+        body, moodle_session = await login(
+            user_data.username, user_data.password, client
+        )
+        if LOGIN_FAILED in body or LOGIN_SUCCEEDED not in body:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="invalid username or password",
             )
-        elif "Academic Status" in response.text:
-            user_id = (
-                m.group(1)
-                if (m := re.search(r"/user/profile\.php\?id=(\d+)", response.text))
-                else None
-            )
-            sesskey = (
-                m := re.search(r'sesskey["\'=:\s>]+([a-zA-Z0-9]{8,})', response.text)
-            ) and m.group(1)
+        elif LOGIN_SUCCEEDED in body:
+            user_id = m.group(1) if (m := USER_ID_PATTERN.search(body)) else None
+            sesskey = (m := SESSKEY_PATTERN.search(body)) and m.group(1)
+            if moodle_session:
+                # later requests can leave out x-user-id and X-API-Key
+                await sessions.update(
+                    moodle_session,
+                    user_id=user_id,
+                    session_key=sesskey,
+                    generation=new_generation(),
+                )
 
             return LoginResponse(
                 user_id=user_id,
@@ -58,6 +67,7 @@ async def auth_logout(
     client: HTTPClientDep,
 ):
     try:
+        await sessions.invalidate(token.credentials)
         resposne = await logout(session_key, token, client)
         return resposne.text
     except Exception:
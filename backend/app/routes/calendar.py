@@ -1,13 +1,44 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import Response
 from fastapi.security import HTTPAuthorizationCredentials
 
+from app.core.calendar import EventIndex, calendar_store, to_ical
+from app.core.codec import decode, respond
+from app.core.config import settings
 from app.core.http import HTTPClientDep, security
+from app.core.tracing import TracedRoute
 from app.schemas.calendar import CalendarBase
 from app.services.calendar import calendar
+from app.services.user import ApiKeyDep
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
+
+
+async def event_index(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    key: ApiKeyDep,
+) -> EventIndex:
+    # the upstream call goes through the response cache, the index is only
+    # touched when its body changed
+    response = await calendar(key, token, client)
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="unable to fetch calendar events",
+        )
+    body = decode(response)
+    if isinstance(body, dict) and body.get("exception"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"invalid or expired key -> {body.get('message')}",
+        )
+    return calendar_store.refresh(key, response.content, body.get("events") or [])
+
+
+EventIndexDep = Annotated[EventIndex, Depends(event_index)]
 
 
 @router.get(
@@ -17,14 +48,38 @@ router = APIRouter()
     operation_id="get_calendar_events",
 )
 async def fetch_annoucements(
-    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
-    client: HTTPClientDep,
-    key: str = Header(..., alias="X-API-Key"),
+    index: EventIndexDep,
+    start: int | None = Query(
+        None, alias="from", description="unix time, events starting at or after"
+    ),
+    end: int | None = Query(
+        None, alias="to", description="unix time, events starting before"
+    ),
+    limit: int | None = Query(None, ge=1, le=1000),
 ):
-    try:
-        response = await calendar(key, token, client)
+    return respond(list[CalendarBase], index.range(start, end, limit))
+
 
-        if response.status_code == 200:
-            return response.json().get("events")
-    except HTTPException:
-        raise
+@router.get(
+    "/upcoming",
+    response_model=list[CalendarBase],
+    status_code=status.HTTP_200_OK,
+)
+async def fetch_upcoming_events(
+    index: EventIndexDep,
+    limit: int = Query(settings.calendar_upcoming_default, ge=1, le=1000),
+):
+    return respond(list[CalendarBase], index.upcoming(limit))
+
+
+@router.get("/export.ics", status_code=status.HTTP_200_OK)
+async def export_calendar(
+    index: EventIndexDep,
+    start: int | None = Query(None, alias="from"),
+    end: int | None = Query(None, alias="to"),
+):
+    return Response(
+        to_ical(index.range(start, end), settings.project_name),
+        media_type="text/calendar",
+        headers={"Content-Disposition": 'attachment; filename="calendar.ics"'},
+    )
@@ -1,17 +1,52 @@
-from typing import Annotated
+import hashlib
+from typing import Annotated, Literal
+from urllib.parse import quote
 
-from fastapi import APIRouter, Depends, Header, HTTPException, status
+import httpx
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials
+from pydantic import ValidationError
+from starlette.background import BackgroundTask
 
+from app.core.config import settings
+from app.core.files import document_store
+from app.core.codec import ModelResponse, decode, is_object, parse, respond, validate
 from app.core.http import HTTPClientDep, security
+from app.core.search import search_index
+from app.core.sync import content_sync
+from app.core.tracing import TracedRoute
+from app.core.utils import NDJSON_MEDIA_TYPE, accepts_ndjson, ndjson_lines
 from app.schemas.content import (
+    ContentChanges,
+    CourseContents,
     CourseDetail,
+    SearchResult,
     SubjectDetail,
     WeekBase,
 )
-from app.services.content import course, docs, sem
+from app.services.content import (
+    can_download,
+    course,
+    docs,
+    docs_many,
+    document,
+    sem,
+)
+from app.services.export import archive, safe_name
+from app.services.user import ApiKeyDep, UserIdDep
+
+router = APIRouter(route_class=TracedRoute)
 
-router = APIRouter()
+PASSTHROUGH_HEADERS = (
+    "content-type",
+    "content-length",
+    "content-range",
+    "content-encoding",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+)
 
 
 @router.get(
@@ -23,13 +58,13 @@ router = APIRouter()
 async def fetch_current_semester_data(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-    user_id: str = Header(..., alias="x-user-id"),
-    key: str = Header(..., alias="X-API-Key"),
+    user_id: UserIdDep,
+    key: ApiKeyDep,
 ):
     try:
         response = await sem(key, user_id, token, client)
         if response.status_code == 200:
-            return response.json()
+            return respond(list[SubjectDetail], decode(response))
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -48,13 +83,13 @@ async def fetch_current_semester_data(
 async def fetch_enrolled_courses(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-    user_id: str = Header(..., alias="x-user-id"),
-    key: str = Header(..., alias="X-API-Key"),
+    user_id: UserIdDep,
+    key: ApiKeyDep,
 ):
     try:
         response = await course(key, user_id, token, client)
         if response.status_code == 200:
-            return response.json()
+            return respond(list[CourseDetail], decode(response))
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -74,20 +109,25 @@ async def fetch_course_docs(
     course_id: str,
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-    key: str = Header(..., alias="X-API-Key"),
+    key: ApiKeyDep,
+    accept: str | None = Header(None),
 ):
     try:
         response = await docs(key, course_id, token, client)
         if response.status_code == 200:
-            if (
-                isinstance(response.json(), dict)
-                and response.json().get("exception") is not None
-            ):
+            if is_object(response) and decode(response).get("exception") is not None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"invalid or expired key -> {response.json().get('message')}",
+                    detail=f"invalid or expired key -> {decode(response).get('message')}",
                 )
-            return [WeekBase.model_validate(item) for item in response.json()]
+            if accepts_ndjson(accept):
+                return StreamingResponse(
+                    ndjson_lines(weeks(decode(response))),
+                    media_type=NDJSON_MEDIA_TYPE,
+                )
+            data = parse(list[WeekBase], response)
+            await track_course_docs(course_id, response, data, key)
+            return ModelResponse(list[WeekBase], data)
         else:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -95,3 +135,362 @@ async def fetch_course_docs(
             )
     except Exception:
         raise
+
+
+async def track_course_docs(
+    course_id: str, response: httpx.Response, data: list[WeekBase], key: str
+) -> None:
+    digest = hashlib.blake2b(response.content, digest_size=16).hexdigest()
+    await search_index.index_course(key, int(course_id), digest, data)
+    await content_sync.sync(key, int(course_id), digest, data)
+
+
+async def weeks(items: list[dict]):
+    for item in items:
+        yield validate(WeekBase, item)
+
+
+async def course_contents(
+    course_id: str,
+    result: httpx.Response | Exception,
+    detail: CourseDetail | None,
+    key: str,
+) -> CourseContents:
+    contents = CourseContents(
+        id=int(course_id),
+        sub_code=detail and detail.sub_code,
+        sub_title=detail and detail.sub_title,
+    )
+    if isinstance(result, Exception):
+        contents.error = str(result) or result.__class__.__name__
+    elif result.status_code != 200:
+        contents.error = "unble to fetch course data"
+    else:
+        try:
+            if is_object(result) and decode(result).get("exception"):
+                message = decode(result).get("message")
+                contents.error = f"invalid or expired key -> {message}"
+                return contents
+            contents.weeks = parse(list[WeekBase], result)
+        except (ValidationError, ValueError):
+            # a body that is not json or not a list of weeks fails this course
+            # only, not the whole batch or the stream around it
+            contents.error = "unexpected course data"
+            return contents
+        await track_course_docs(course_id, result, contents.weeks, key)
+    return contents
+
+
+@router.get(
+    "/courses/contents",
+    response_model=list[CourseContents],
+    status_code=status.HTTP_200_OK,
+    operation_id="get_all_course_docs",
+)
+async def fetch_all_course_docs(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    user_id: UserIdDep,
+    key: ApiKeyDep,
+    course_id: Annotated[list[int] | None, Query()] = None,
+    accept: str | None = Header(None),
+):
+    try:
+        response = await course(key, user_id, token, client)
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="unble to fetch semester data",
+            )
+        body = decode(response)
+        if isinstance(body, dict):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"invalid or expired key -> {body.get('message')}",
+            )
+        enrolled = {
+            str(detail.id): detail for detail in validate(list[CourseDetail], body)
+        }
+        course_ids = [str(id) for id in course_id] if course_id else list(enrolled)
+        results = (
+            await course_contents(id, result, enrolled.get(id), key)
+            async for id, result in docs_many(key, course_ids, token, client)
+        )
+        if accepts_ndjson(accept):
+            return StreamingResponse(
+                ndjson_lines(results), media_type=NDJSON_MEDIA_TYPE
+            )
+        return ModelResponse(
+            list[CourseContents], [contents async for contents in results]
+        )
+    except Exception:
+        raise
+
+
+@router.get(
+    "/search",
+    response_model=list[SearchResult],
+    status_code=status.HTTP_200_OK,
+    operation_id="search_course_docs",
+)
+async def search_course_docs(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    user_id: UserIdDep,
+    key: ApiKeyDep,
+    q: str = "",
+    doc_type: str | None = None,
+    module_type: str | None = None,
+    sort: Literal["relevance", "newest", "oldest"] = "relevance",
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+):
+    try:
+        response = await course(key, user_id, token, client)
+        if response.status_code != 200 or isinstance(body := decode(response), dict):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="unble to fetch semester data",
+            )
+        course_ids = [detail["id"] for detail in body]
+        stale = await search_index.stale(
+            key, course_ids, settings.search_refresh_interval
+        )
+        # indexing happens as a side effect of parsing each course
+        async for id, result in docs_many(key, list(map(str, stale)), token, client):
+            await course_contents(id, result, None, key)
+        return respond(
+            list[SearchResult],
+            await search_index.search(
+                key, q, course_ids, doc_type, module_type, sort, limit
+            ),
+        )
+    except Exception:
+        raise
+
+
+@router.get(
+    "/course/{course_id}/changes",
+    response_model=ContentChanges,
+    status_code=status.HTTP_200_OK,
+    operation_id="get_course_changes",
+)
+async def fetch_course_changes(
+    course_id: str,
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    key: ApiKeyDep,
+    since: float = 0,
+):
+    response = await docs(key, course_id, token, client)
+    contents = await course_contents(course_id, response, None, key)
+    if contents.error:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=contents.error
+        )
+    changes = await content_sync.changes(key, [int(course_id)], since)
+    return respond(ContentChanges, {"since": since, **changes})
+
+
+@router.get(
+    "/changes",
+    response_model=ContentChanges,
+    status_code=status.HTTP_200_OK,
+    operation_id="get_content_changes",
+)
+async def fetch_content_changes(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    user_id: UserIdDep,
+    key: ApiKeyDep,
+    since: float = 0,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+):
+    response = await course(key, user_id, token, client)
+    if response.status_code != 200 or isinstance(body := decode(response), dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="unble to fetch semester data",
+        )
+    course_ids = [detail["id"] for detail in body]
+    async for id, result in docs_many(key, list(map(str, course_ids)), token, client):
+        await course_contents(id, result, None, key)
+    # follow until while has_more is set to page through everything
+    changes = await content_sync.changes(key, course_ids, since, limit)
+    return respond(ContentChanges, {"since": since, **changes})
+
+
+def content_disposition(title: str, download: bool) -> str:
+    fallback = title.encode("ascii", "replace").decode().replace('"', "")
+    return (
+        f'{"attachment" if download else "inline"}; filename="{fallback}"; '
+        f"filename*=UTF-8''{quote(title)}"
+    )
+
+
+@router.get("/file", status_code=status.HTTP_200_OK)
+async def fetch_file(
+    url: str,
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    key: ApiKeyDep,
+    title: str | None = None,
+    size: int | None = None,
+    modified: int | None = None,
+    download: bool = False,
+    range: str | None = Header(None),
+    if_range: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+):
+    if not url.startswith(f"{settings.lms_url}/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="unsupported document url",
+        )
+    cacheable = document_store is not None and modified is not None
+    reader = document_store and document_store.reader(key, token.credentials)
+    if cacheable and (cached := await document_store.lookup(url, modified, reader)):
+        path, content_type, known = cached
+        # the store is shared, a hit is only served to a caller moodle already
+        # handed this file to, or does now
+        if not known:
+            if not await can_download(key, url, token, client):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="unble to fetch document",
+                )
+            await document_store.grant(url, modified, reader)
+        # FileResponse answers Range/If-Range on its own
+        return FileResponse(
+            path,
+            media_type=content_type,
+            headers={"content-disposition": content_disposition(title, download)}
+            if title
+            else None,
+        )
+
+    forwarded = {
+        name: value
+        for name, value in (
+            ("Range", range),
+            ("If-Range", if_range),
+            ("If-None-Match", if_none_match),
+        )
+        if value is not None
+    }
+    response = await document(key, url, token, client, forwarded)
+    if response.status_code in (
+        status.HTTP_304_NOT_MODIFIED,
+        status.HTTP_416_RANGE_NOT_SATISFIABLE,
+    ):
+        # nothing to stream: the client's copy is current, or a resumed
+        # download is already complete (content-range says how big it is)
+        await response.aclose()
+        return Response(
+            status_code=response.status_code,
+            headers={
+                name: response.headers[name]
+                for name in ("content-range", "accept-ranges", "etag", "last-modified")
+                if name in response.headers
+            },
+        )
+    if response.status_code not in (200, 206):
+        await response.aclose()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="unble to fetch document",
+        )
+
+    headers = {
+        name: response.headers[name]
+        for name in PASSTHROUGH_HEADERS
+        if name in response.headers
+    }
+    if (
+        response.status_code == 200
+        and size is not None
+        and "content-length" not in headers
+        and "content-encoding" not in headers
+    ):
+        headers["content-length"] = str(size)
+    if title:
+        headers["content-disposition"] = content_disposition(title, download)
+    body = response.aiter_raw()
+    if cacheable and response.status_code == 200 and "content-encoding" not in headers:
+        body = document_store.save(
+            url, modified, headers.get("content-type"), body, reader
+        )
+    return StreamingResponse(
+        body,
+        status_code=response.status_code,
+        headers=headers,
+        background=BackgroundTask(response.aclose),
+    )
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_documents(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    user_id: UserIdDep,
+    key: ApiKeyDep,
+    course_id: Annotated[list[int] | None, Query()] = None,
+    semester: str | None = None,
+):
+    if semester:
+        response = await sem(key, user_id, token, client)
+        subjects = SubjectDetail
+    else:
+        response = await course(key, user_id, token, client)
+        subjects = CourseDetail
+    if response.status_code != 200 or isinstance(body := decode(response), dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="unble to fetch semester data",
+        )
+    selected = {
+        str(subject.id): subject
+        for subject in validate(list[subjects], body)
+        if (semester and subject.sem_title == semester)
+        or (course_id and subject.id in course_id)
+    }
+    if not selected:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="no matching courses",
+        )
+
+    entries, failed, taken = [], [], set()
+    async for id, result in docs_many(key, list(selected), token, client):
+        contents = await course_contents(id, result, None, key)
+        folder = safe_name(selected[id].sub_title or selected[id].sub_code, id)
+        if contents.error:
+            failed.append(f"{folder}: {contents.error}")
+        for week in contents.weeks:
+            for module in week.modules:
+                for doc in module.docs:
+                    if doc.doc_type != "file" or not doc.doc_url:
+                        continue
+                    name = "/".join((
+                        folder,
+                        safe_name(week.week_title, str(week.week_id)),
+                        safe_name(module.module_title, str(module.module_id)),
+                        safe_name(doc.doc_title, "document"),
+                    ))
+                    stem, dot, ext = name.rpartition(".")
+                    copy = 1
+                    while name in taken:
+                        copy += 1
+                        name = f"{stem} ({copy}).{ext}" if dot else f"{ext} ({copy})"
+                    taken.add(name)
+                    entries.append((name, doc))
+
+    filename = safe_name(semester, "") or "-".join(
+        safe_name(subject.sub_code, id) for id, subject in selected.items()
+    )
+    return StreamingResponse(
+        archive(key, entries, token, client, failed),
+        media_type="application/zip",
+        headers={
+            "content-disposition": content_disposition(f"{filename}.zip", True)
+        },
+    )
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from typing import Annotated, Any
+
+import httpx
+from fastapi import APIRouter, Depends, status
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.core.codec import decode, respond
+from app.core.http import HTTPClientDep, security
+from app.core.tracing import TracedRoute
+from app.schemas.dashboard import DashboardResponse
+from app.services.attendance import attendance
+from app.services.calendar import calendar
+from app.services.content import sem
+from app.services.user import ApiKeyDep, UserIdDep
+
+router = APIRouter(route_class=TracedRoute)
+
+
+async def section(
+    call: Awaitable[httpx.Response],
+    extract: Callable[[Any], Any] = lambda data: data,
+) -> dict[str, Any]:
+    start = time.perf_counter()
+    data, error = None, None
+    try:
+        response = await call
+        if response.status_code != 200:
+            error = f"upstream returned {response.status_code}"
+        elif isinstance(body := decode(response), dict) and body.get("exception"):
+            error = f"invalid or expired key -> {body.get('message')}"
+        else:
+            data = extract(body)
+    except Exception as exc:
+        error = str(exc) or exc.__class__.__name__
+    return {
+        "data": data,
+        "error": error,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+@router.get(
+    "",
+    response_model=DashboardResponse,
+    status_code=status.HTTP_200_OK,
+    operation_id="get_dashboard",
+)
+async def fetch_dashboard(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    user_id: UserIdDep,
+    key: ApiKeyDep,
+):
+    courses, attendances, events = await asyncio.gather(
+        section(sem(key, user_id, token, client)),
+        section(attendance(key, user_id, token, client)),
+        section(calendar(key, token, client), lambda data: data.get("events")),
+    )
+    return respond(
+        DashboardResponse,
+        {"courses": courses, "attendance": attendances, "calendar": events},
+    )
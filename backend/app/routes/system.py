@@ -1,17 +1,92 @@
-import time
-
-from fastapi import APIRouter, status
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, status
+from fastapi.responses import JSONResponse, Response
 
+from app.core.breaker import breakers
+from app.core.calendar import calendar_store
 from app.core.config import settings
+from app.core.files import document_store
+from app.core.http import inflight, pool_stats, response_cache
+from app.core.metrics import CONTENT_TYPE, StatsCollector, registry
+from app.core.retry import retry_stats
+from app.core.sessions import sessions
+from app.core.tracing import TracedRoute, slow_traces
+from app.services.poller import pollers
+from app.services.prefetch import prefetch_stats
+
+router = APIRouter(route_class=TracedRoute)
 
-router = APIRouter()
+registry.register(
+    StatsCollector(
+        "mydylms_response_cache",
+        "Webservice response cache",
+        lambda: {(): response_cache.stats()},
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_coalescing",
+        "Identical upstream calls sharing one request",
+        lambda: {(): inflight.stats()},
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_pool", "Upstream connection pool", lambda: {(): pool_stats()}
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_breaker",
+        "Upstream circuit breakers",
+        lambda: {
+            (name,): {**breaker.stats(), "open": int(breaker.state == "open")}
+            for name, breaker in breakers.items()
+        },
+        ("endpoint",),
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_retry", "Upstream retries", lambda: {(): retry_stats.stats()}
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_sessions", "Session registry", lambda: {(): sessions.stats()}
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_prefetch",
+        "Post-login cache warm-up",
+        lambda: {(): prefetch_stats.stats()},
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_announcement_poller",
+        "Announcement pollers and their streams",
+        lambda: {(): pollers.stats()},
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_calendar",
+        "Per-user calendar event indexes",
+        lambda: {(): calendar_store.stats()},
+    )
+)
+registry.register(
+    StatsCollector(
+        "mydylms_document_cache",
+        "On-disk document cache",
+        lambda: {(): document_store.stats()} if document_store else {},
+    )
+)
 
 
 @router.get("/api", status_code=status.HTTP_200_OK)
 def read_root():
-    start_time = time.perf_counter()
-    print(f"Time: {(time.perf_counter() - start_time):.3f}ms")
     return JSONResponse({
         "name": settings.project_name,
         "version": settings.version,
@@ -21,6 +96,33 @@ def read_root():
 
 @router.get("/health", status_code=status.HTTP_200_OK)
 def health_check():
-    start_time = time.perf_counter()
-    print(f"Time: {(time.perf_counter() - start_time) * 1000:.3f}ms")
-    return JSONResponse({"status": "healthy"})
+    return JSONResponse({
+        "status": "healthy"
+        if all(breaker.state != "open" for breaker in breakers.values())
+        else "degraded",
+        "cache": response_cache.stats(),
+        "coalescing": inflight.stats(),
+        "pool": pool_stats(),
+        "upstream": {name: breaker.stats() for name, breaker in breakers.items()},
+        "retries": retry_stats.stats(),
+        "sessions": sessions.stats(),
+        "prefetch": prefetch_stats.stats(),
+        "announcements": pollers.stats(),
+        "calendar": calendar_store.stats(),
+        "documents": document_store.stats() if document_store else None,
+    })
+
+
+@router.get("/metrics", status_code=status.HTTP_200_OK, include_in_schema=False)
+def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/debug/traces", status_code=status.HTTP_200_OK, include_in_schema=False)
+def debug_traces(limit: int = Query(20, ge=1, le=1000)):
+    # newest first
+    traces = list(slow_traces)[-limit:]
+    return JSONResponse({
+        "threshold_ms": settings.trace_slow_threshold * 1000,
+        "traces": [trace.as_dict() for trace in reversed(traces)],
+    })
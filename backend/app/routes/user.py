@@ -4,11 +4,21 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
 
+from app.core.codec import ModelResponse, decode, respond
 from app.core.http import HTTPClientDep, security
+from app.core.sessions import sessions
+from app.core.tracing import TracedRoute
 from app.schemas.user import KeyResponse, ProfileOldResponse, ProfileResponse
-from app.services.user import keys, old_profile, profile
+from app.services.prefetch import schedule
+from app.services.user import (
+    ApiKeyDep,
+    UserIdDep,
+    old_profile,
+    profile,
+    resolve_keys,
+)
 
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 
 @router.get("/v1/user/keys", response_model=KeyResponse, status_code=status.HTTP_200_OK)
@@ -16,26 +26,27 @@ async def fetch_keys(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
     session_key: str,
+    user_id: str | None = Header(None, alias="x-user-id"),
 ):
     try:
-        response = await keys(session_key, token, client)
-        if response.status_code == 200:
-            key = re.findall(r"[a-fA-F0-9]{32}", response.text)
-            key = (key + [None] * 3)[:3]
-            if not any(key):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No security keys found",
-                )
-            return KeyResponse(
-                web_service_key=key[0],
-                features_service_key=key[1],
-                service_key=key[-1],
-            )
-        else:
+        # a dictionary lookup once the session's keys were scraped
+        key = await resolve_keys(session_key, token, client)
+        if key is None:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="No security keys found"
             )
+        if user_id is None and (session := await sessions.get(token.credentials)):
+            user_id = session.user_id
+        # the first screen uses features_service_key as its X-API-Key
+        schedule(key[1], user_id, token, client)
+        return ModelResponse(
+            KeyResponse,
+            KeyResponse(
+                web_service_key=key[0],
+                features_service_key=key[1],
+                service_key=key[-1],
+            ),
+        )
     except HTTPException:
         raise
 
@@ -49,13 +60,14 @@ async def fetch_keys(
 async def fetch_profile_old(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-    user_id: str = Header(..., alias="x-user-id"),
+    user_id: UserIdDep,
 ):
     try:
         response = await old_profile(user_id, token, client)
         if response.status_code == 200:
-            return ProfileOldResponse(
-                **dict(
+            return respond(
+                ProfileOldResponse,
+                dict(
                     zip(
                         ProfileOldResponse.model_fields.keys(),
                         re.findall(
@@ -63,7 +75,7 @@ async def fetch_profile_old(
                             response.text,
                         ),
                     )
-                )
+                ),
             )
         else:
             raise HTTPException(
@@ -83,21 +95,19 @@ async def fetch_profile_old(
 async def fetch_profile(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-    user_id: str = Header(..., alias="x-user-id"),
-    key: str = Header(..., alias="X-API-Key"),
+    user_id: UserIdDep,
+    key: ApiKeyDep,
 ):
     try:
         response = await profile(user_id, key, token, client)
         if response.status_code == 200:
-            if (
-                isinstance(response.json(), dict)
-                and response.json().get("exception") is not None
-            ):
+            body = decode(response)
+            if isinstance(body, dict) and body.get("exception") is not None:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"invalid or expired key -> {response.json().get('message')}",
+                    detail=f"invalid or expired key -> {body.get('message')}",
                 )
-            return response.json()[-1]
+            return respond(ProfileResponse, body[-1])
         else:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
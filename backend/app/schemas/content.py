@@ -39,3 +39,54 @@ class WeekBase(BaseModel):
     week_id: Optional[int] = Field(None, validation_alias="id")
     week_title: Optional[str] = Field(None, validation_alias="name")
     modules: list[ModuleBase] = Field(default_factory=list)
+
+
+class CourseContents(BaseModel):
+    id: Optional[int] = Field(None)
+    sub_code: Optional[str] = Field(None)
+    sub_title: Optional[str] = Field(None)
+    weeks: list[WeekBase] = Field(default_factory=list)
+    error: Optional[str] = Field(None)
+
+
+class SearchResult(BaseModel):
+    course_id: Optional[int] = Field(None)
+    week_id: Optional[int] = Field(None)
+    week_title: Optional[str] = Field(None)
+    module_id: Optional[int] = Field(None)
+    module_title: Optional[str] = Field(None)
+    module_type: Optional[str] = Field(None)
+    doc_type: Optional[str] = Field(None)
+    doc_title: Optional[str] = Field(None)
+    doc_size: Optional[int] = Field(None)
+    doc_url: Optional[str] = Field(None)
+    teacher_name: Optional[str] = Field(None)
+    created_at: Optional[int] = Field(None)
+    modified_at: Optional[int] = Field(None)
+    score: Optional[float] = Field(None, validation_alias="rank")
+
+
+class DocChange(BaseModel):
+    course_id: Optional[int] = Field(None)
+    changed_at: Optional[float] = Field(None)
+    week_id: Optional[int] = Field(None)
+    week_title: Optional[str] = Field(None)
+    module_id: Optional[int] = Field(None)
+    module_title: Optional[str] = Field(None)
+    module_type: Optional[str] = Field(None)
+    doc_type: Optional[str] = Field(None)
+    doc_title: Optional[str] = Field(None)
+    doc_size: Optional[int] = Field(None)
+    doc_url: Optional[str] = Field(None)
+    teacher_name: Optional[str] = Field(None)
+    created_at: Optional[int] = Field(None)
+    modified_at: Optional[int] = Field(None)
+
+
+class ContentChanges(BaseModel):
+    since: float
+    until: float
+    has_more: bool = False
+    added: list[DocChange] = Field(default_factory=list)
+    modified: list[DocChange] = Field(default_factory=list)
+    removed: list[DocChange] = Field(default_factory=list)
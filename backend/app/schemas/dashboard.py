@@ -0,0 +1,21 @@
+from typing import Generic, Optional, TypeVar
+
+from pydantic import BaseModel, Field
+
+from app.schemas.attendance import SubAttendance
+from app.schemas.calendar import CalendarBase
+from app.schemas.content import SubjectDetail
+
+T = TypeVar("T")
+
+
+class DashboardSection(BaseModel, Generic[T]):
+    data: Optional[T] = Field(None)
+    error: Optional[str] = Field(None)
+    elapsed_ms: Optional[float] = Field(None)
+
+
+class DashboardResponse(BaseModel):
+    courses: DashboardSection[list[SubjectDetail]]
+    attendance: DashboardSection[list[SubAttendance]]
+    calendar: DashboardSection[list[CalendarBase]]
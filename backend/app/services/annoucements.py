@@ -2,7 +2,7 @@ from fastapi.security import HTTPAuthorizationCredentials
 from fastapi import Depends
 from typing import Annotated
 
-from app.core.http import HTTPClientDep, security
+from app.core.http import HTTPClientDep, security, webservice
 
 
 async def annoucement(
@@ -10,16 +10,15 @@ async def annoucement(
     key: str,
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
+    refresh: bool = False,
 ):
-    return await client.get(
-        url="https://mydy.dypatil.edu/rait/webservice/rest/server.php",
-        params={
-            "wstoken": key,
-            "moodlewsrestformat": "json",
-            "wsfunction": "local_user_announcements_custom",
-            "userid": user_id,
-        },
-        headers={"Cookie": f"MoodleSession={token.credentials}"},
+    return await webservice(
+        client,
+        key,
+        token,
+        "local_user_announcements_custom",
+        refresh=refresh,
+        userid=user_id,
     )
 
 
@@ -29,13 +28,10 @@ async def annoucement_all(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
 ):
-    return await client.get(
-        url="https://mydy.dypatil.edu/rait/webservice/rest/server.php",
-        params={
-            "wstoken": key,
-            "moodlewsrestformat": "json",
-            "wsfunction": "local_user_announcementsall_custom",
-            "userid": user_id,
-        },
-        headers={"Cookie": f"MoodleSession={token.credentials}"},
+    return await webservice(
+        client,
+        key,
+        token,
+        "local_user_announcementsall_custom",
+        userid=user_id,
     )
@@ -1,26 +1,95 @@
+import asyncio
+import re
+from collections.abc import AsyncIterator
 from typing import Annotated
 
 import httpx
 from fastapi import Depends
 from fastapi.security import HTTPAuthorizationCredentials
 
+from app.core.breaker import breakers
+from app.core.config import settings
 from app.core.http import HTTPClientDep, security
 
+LOGIN_FAILED = "Invalid login, please try again"
+LOGIN_SUCCEEDED = "Academic Status"
+USER_ID_PATTERN = re.compile(r"/user/profile\.php\?id=(\d+)")
+SESSKEY_PATTERN = re.compile(r'sesskey["\'=:\s>]+([a-zA-Z0-9]{8,})')
 
-async def login(username: str, password: str) -> tuple[httpx.Response, str | None]:
+_releasing: set[asyncio.Task] = set()
+
+
+def has_login_markers(body: str) -> bool:
+    return LOGIN_FAILED in body or (
+        LOGIN_SUCCEEDED in body
+        and USER_ID_PATTERN.search(body) is not None
+        and SESSKEY_PATTERN.search(body) is not None
+    )
+
+
+async def release(response: httpx.Response, chunks: AsyncIterator[str]) -> None:
+    # an unread HTTP/1.1 body would cost the pooled connection, an h2 stream
+    # can simply be reset
+    try:
+        if response.http_version == "HTTP/1.1":
+            async for _ in chunks:
+                pass
+    except httpx.HTTPError:
+        pass
+    finally:
+        await response.aclose()
+
+
+def release_later(response: httpx.Response, chunks: AsyncIterator[str]) -> None:
+    task = asyncio.create_task(release(response, chunks))
+    _releasing.add(task)
+    task.add_done_callback(_releasing.discard)
+
+
+async def read_login_page(chunks: AsyncIterator[str]) -> str:
+    # the dashboard is heavy, answer as soon as the markers are in and let
+    # the rest of the body drain in the background
+    body = ""
+    async for chunk in chunks:
+        body += chunk
+        if has_login_markers(body):
+            break
+    return body
+
+
+async def login(
+    username: str, password: str, client: httpx.AsyncClient
+) -> tuple[str, str | None]:
     data = {
         "uname_static": username,
         "username": username,
         "uname": username,
         "password": password,
     }
-    async with httpx.AsyncClient(follow_redirects=True) as temp_client:
-        response = await temp_client.post(
-            url="https://mydy.dypatil.edu/rait/login/index.php",
-            data=data,
+    # the shared client ignores cookies, so the login chain keeps its own jar
+    cookies = httpx.Cookies()
+    request = client.build_request(
+        "POST", url=f"{settings.lms_url}/login/index.php", data=data
+    )
+    for _ in range(client.max_redirects + 1):
+        response = await breakers["login"].call(
+            lambda: client.send(request, stream=True)
         )
-        moodle_session = temp_client.cookies.get("MoodleSession")
-        return response, moodle_session
+        cookies.extract_cookies(response)
+        if response.next_request is None:
+            chunks = response.aiter_text()
+            try:
+                body = await read_login_page(chunks)
+            except BaseException:
+                await response.aclose()
+                raise
+            release_later(response, chunks)
+            return body, cookies.get("MoodleSession")
+        await response.aread()
+        await response.aclose()
+        request = response.next_request
+        cookies.set_cookie_header(request)
+    raise httpx.TooManyRedirects("Exceeded maximum allowed redirects.", request=request)
 
 
 async def logout(
@@ -29,7 +98,7 @@ async def logout(
     client: HTTPClientDep,
 ):
     return await client.get(
-        url="https://mydy.dypatil.edu/rait/login/logout.php",
+        url=f"{settings.lms_url}/login/logout.php",
         params={"sesskey": session_key},
         headers={"Cookie": f"MoodleSession={token.credentials}"},
     )
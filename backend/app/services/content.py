@@ -1,8 +1,14 @@
+import asyncio
+from collections.abc import AsyncIterator
 from typing import Annotated
+
+import httpx
 from fastapi import Depends
 from fastapi.security import HTTPAuthorizationCredentials
 
-from app.core.http import HTTPClientDep, security
+from app.core.breaker import breakers
+from app.core.config import settings
+from app.core.http import HTTPClientDep, security, webservice
 
 
 async def sem(
@@ -11,15 +17,12 @@ async def sem(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
 ):
-    return await client.get(
-        url="https://mydy.dypatil.edu/rait/webservice/rest/server.php",
-        params={
-            "wstoken": key,
-            "moodlewsrestformat": "json",
-            "wsfunction": "local_user_courses_custom",
-            "userid": user_id,
-        },
-        headers={"Cookie": f"MoodleSession={token.credentials}"},
+    return await webservice(
+        client,
+        key,
+        token,
+        "local_user_courses_custom",
+        userid=user_id,
     )
 
 
@@ -29,15 +32,12 @@ async def course(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
 ):
-    return await client.get(
-        url="https://mydy.dypatil.edu/rait/webservice/rest/server.php",
-        params={
-            "wstoken": key,
-            "moodlewsrestformat": "json",
-            "wsfunction": "core_enrol_get_users_courses",
-            "userid": user_id,
-        },
-        headers={"Cookie": f"MoodleSession={token.credentials}"},
+    return await webservice(
+        client,
+        key,
+        token,
+        "core_enrol_get_users_courses",
+        userid=user_id,
     )
 
 
@@ -47,13 +47,64 @@ async def docs(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
 ):
-    return await client.get(
-        url="https://mydy.dypatil.edu/rait/webservice/rest/server.php",
-        params={
-            "wstoken": key,
-            "moodlewsrestformat": "json",
-            "wsfunction": "core_course_get_contents",
-            "courseid": course_id,
-        },
-        headers={"Cookie": f"MoodleSession={token.credentials}"},
+    return await webservice(
+        client,
+        key,
+        token,
+        "core_course_get_contents",
+        courseid=course_id,
+    )
+
+
+async def docs_many(
+    key: str,
+    course_ids: list[str],
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+) -> AsyncIterator[tuple[str, httpx.Response | Exception]]:
+    semaphore = asyncio.Semaphore(settings.content_fanout_concurrency)
+
+    async def fetch(course_id: str) -> tuple[str, httpx.Response | Exception]:
+        async with semaphore:
+            try:
+                return course_id, await docs(key, course_id, token, client)
+            except Exception as exc:
+                return course_id, exc
+
+    tasks = [asyncio.ensure_future(fetch(course_id)) for course_id in course_ids]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def document(
+    key: str,
+    url: str,
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    headers: dict[str, str] | None = None,
+) -> httpx.Response:
+    request = client.build_request(
+        "GET",
+        url=httpx.URL(url).copy_merge_params({"token": key}),
+        headers={"Cookie": f"MoodleSession={token.credentials}", **(headers or {})},
+    )
+    return await breakers["pluginfile"].call(
+        lambda: client.send(request, stream=True)
     )
+
+
+async def can_download(
+    key: str,
+    url: str,
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+) -> bool:
+    # moodle decides per file (course, module restrictions, groups), a one byte
+    # request asks it without moving the file again
+    response = await document(key, url, token, client, {"Range": "bytes=0-0"})
+    await response.aclose()
+    return response.status_code in (200, 206)
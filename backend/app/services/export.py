@@ -0,0 +1,154 @@
+import asyncio
+import io
+import os
+import re
+import tempfile
+import time
+import zipfile
+from collections.abc import AsyncIterator
+from typing import Annotated, BinaryIO
+
+import httpx
+from fastapi import Depends
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.core.config import settings
+from app.core.files import document_store
+from app.core.http import HTTPClientDep, security
+from app.schemas.content import DocBase
+from app.services.content import can_download, document
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ZipStream(io.RawIOBase):
+    # write-only sink for zipfile; being unseekable makes zipfile emit data
+    # descriptors instead of seeking back to patch headers
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._offset = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def safe_name(name: str | None, fallback: str) -> str:
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", name or "").strip(" .")
+    return name or fallback
+
+
+async def stage(
+    key: str,
+    doc: DocBase,
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+) -> BinaryIO:
+    cacheable = document_store is not None and doc.modified_at is not None
+    reader = document_store and document_store.reader(key, token.credentials)
+    if cacheable and (
+        cached := await document_store.lookup(doc.doc_url, doc.modified_at, reader)
+    ):
+        path, _, known = cached
+        # same rule as /file: the shared store only serves whom moodle would
+        if known or await can_download(key, doc.doc_url, token, client):
+            if not known:
+                await document_store.grant(doc.doc_url, doc.modified_at, reader)
+            return await asyncio.to_thread(open, path, "rb")
+
+    response = await document(key, doc.doc_url, token, client)
+    file = await asyncio.to_thread(tempfile.TemporaryFile)
+    try:
+        response.raise_for_status()
+        if cacheable and "content-encoding" not in response.headers:
+            # the archive reads its own copy, the blob may be evicted (or be
+            # over the budget) by the time the download is done
+            chunks = document_store.save(
+                doc.doc_url,
+                doc.modified_at,
+                response.headers.get("content-type"),
+                response.aiter_raw(),
+                reader,
+            )
+        else:
+            chunks = response.aiter_bytes()
+        async for chunk in chunks:
+            await asyncio.to_thread(file.write, chunk)
+        file.seek(0)
+        return file
+    except BaseException:
+        file.close()
+        raise
+    finally:
+        await response.aclose()
+
+
+async def archive(
+    key: str,
+    entries: list[tuple[str, DocBase]],
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    failed: list[str] | None = None,
+) -> AsyncIterator[bytes]:
+    # a download holds its slot until it has been written to the archive, so
+    # at most export_concurrency files are staged at any time
+    slots = asyncio.Semaphore(settings.export_concurrency)
+    ready: asyncio.Queue = asyncio.Queue()
+
+    async def fetch(name: str, doc: DocBase) -> None:
+        await slots.acquire()
+        try:
+            await ready.put((name, doc, await stage(key, doc, token, client)))
+        except httpx.HTTPStatusError as exc:
+            # the request url carries the wstoken, keep it out of the archive
+            error = f"upstream returned {exc.response.status_code}"
+            await ready.put((name, doc, error))
+        except Exception as exc:
+            await ready.put((name, doc, str(exc) or exc.__class__.__name__))
+
+    tasks = [asyncio.create_task(fetch(name, doc)) for name, doc in entries]
+    stream = ZipStream()
+    failed = list(failed or [])
+    try:
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_STORED) as zip_file:
+            for _ in entries:
+                name, doc, result = await ready.get()
+                try:
+                    if isinstance(result, str):
+                        failed.append(f"{name}: {result}")
+                        continue
+                    info = zipfile.ZipInfo(name, zip_timestamp(doc.modified_at))
+                    info.file_size = os.fstat(result.fileno()).st_size
+                    with result, zip_file.open(info, "w") as target:
+                        while chunk := result.read(CHUNK_SIZE):
+                            target.write(chunk)
+                            yield stream.drain()
+                finally:
+                    slots.release()
+            if failed:
+                zip_file.writestr("_failed.txt", "\n".join(failed) + "\n")
+        yield stream.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+        while not ready.empty():
+            if not isinstance(result := ready.get_nowait()[2], str):
+                result.close()
+
+
+def zip_timestamp(modified: int | None) -> tuple[int, int, int, int, int, int]:
+    if not modified:
+        return time.localtime()[:6]
+    return max(time.localtime(modified)[:6], (1980, 1, 1, 0, 0, 0))
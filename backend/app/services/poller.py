@@ -0,0 +1,191 @@
+import asyncio
+import contextvars
+import time
+
+import httpx
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.core.breaker import UpstreamUnavailable
+from app.core.codec import adapter, decode, validate
+from app.core.config import settings
+from app.core.http import is_expired
+from app.schemas.announcement import AnnouncementBase
+from app.services.annoucements import annoucement
+
+EXPIRED_EVENT = b"event: expired\ndata: {}\n\n"
+
+
+def announcement_event(post: AnnouncementBase) -> bytes:
+    data = adapter(AnnouncementBase).dump_json(post)
+    return b"id: %s\nevent: announcement\ndata: %s\n\n" % (
+        (post.id or "").encode(),
+        data,
+    )
+
+
+class PollerStats:
+    def __init__(self):
+        self.polls = 0
+        self.failures = 0
+        self.pushed = 0
+        self.dropped = 0
+
+    def stats(self) -> dict[str, int]:
+        return dict(vars(self))
+
+
+poller_stats = PollerStats()
+
+
+class AnnouncementPoller:
+    # one per user and MoodleSession, shared by every stream that session has
+    # open. Polls faster right after new posts, backs off while nothing
+    # changes, and stops once nobody has listened for
+    # announcement_poll_idle_timeout
+    def __init__(
+        self,
+        user_id: str,
+        key: str,
+        token: HTTPAuthorizationCredentials,
+        client: httpx.AsyncClient,
+    ):
+        self.user_id = user_id
+        # fixed for the poller's lifetime, a later subscriber never swaps them
+        self.key = key
+        self.token = token
+        self.client = client
+        # None until the first poll, which only records what is already there
+        self.seen: set[str] | None = None
+        self.subscribers: set[asyncio.Queue[bytes | None]] = set()
+        self.interval = settings.announcement_poll_min_interval
+        self.idle_since = time.monotonic()
+        self.wake = asyncio.Event()
+
+    def subscribe(self) -> asyncio.Queue[bytes | None]:
+        queue: asyncio.Queue[bytes | None] = asyncio.Queue(
+            settings.announcement_queue_size
+        )
+        if not self.subscribers:
+            self.interval = settings.announcement_poll_min_interval
+            self.wake.set()
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue[bytes | None]) -> None:
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.idle_since = time.monotonic()
+
+    def publish(self, event: bytes | None) -> None:
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # a stalled client misses the event rather than holding memory
+                poller_stats.dropped += 1
+
+    async def poll(self) -> bool | None:
+        # True when there were new posts, None when the key or session expired
+        poller_stats.polls += 1
+        response = await annoucement(
+            self.user_id, self.key, self.token, self.client, refresh=True
+        )
+        if is_expired(response):
+            return None
+        if response.status_code != 200:
+            raise ValueError(f"announcements answered {response.status_code}")
+        posts = validate(list[AnnouncementBase], decode(response))
+        new = [] if self.seen is None else [p for p in posts if p.id not in self.seen]
+        self.seen = (self.seen or set()) | {post.id for post in posts}
+        for post in new:
+            self.publish(announcement_event(post))
+        poller_stats.pushed += len(new) * len(self.subscribers)
+        return bool(new)
+
+    async def run(self) -> None:
+        while self.subscribers or (
+            time.monotonic() - self.idle_since < settings.announcement_poll_idle_timeout
+        ):
+            try:
+                found = await self.poll()
+            except (
+                HTTPException,
+                UpstreamUnavailable,
+                httpx.HTTPError,
+                ValueError,
+            ):
+                poller_stats.failures += 1
+                self.interval = settings.announcement_poll_max_interval
+            else:
+                if found is None:
+                    self.publish(EXPIRED_EVENT)
+                    break
+                self.interval = (
+                    settings.announcement_poll_min_interval
+                    if found
+                    else min(self.interval * 2, settings.announcement_poll_max_interval)
+                )
+            self.wake.clear()
+            delay = (
+                self.interval
+                if self.subscribers
+                else settings.announcement_poll_max_interval
+            )
+            try:
+                await asyncio.wait_for(self.wake.wait(), delay)
+            except TimeoutError:
+                pass
+        # ends every open stream
+        self.publish(None)
+
+
+class Pollers:
+    # keyed by (user id, MoodleSession): the user id alone is no secret, so
+    # knowing it must not be enough to join someone else's stream
+    def __init__(self):
+        self.pollers: dict[tuple[str, str], AnnouncementPoller] = {}
+        self.tasks: dict[tuple[str, str], asyncio.Task] = {}
+
+    def subscribe(
+        self,
+        user_id: str,
+        key: str,
+        token: HTTPAuthorizationCredentials,
+        client: httpx.AsyncClient,
+    ) -> tuple[AnnouncementPoller, asyncio.Queue[bytes | None]]:
+        session = (user_id, token.credentials)
+        poller = self.pollers.get(session)
+        # a poller that just stopped is replaced, its done callback may not
+        # have run yet
+        if poller is None or self.tasks[session].done():
+            poller = AnnouncementPoller(user_id, key, token, client)
+            self.pollers[session] = poller
+            queue = poller.subscribe()
+            # detached from the request that started it
+            task = asyncio.create_task(poller.run(), context=contextvars.Context())
+            self.tasks[session] = task
+            task.add_done_callback(lambda _: self._forget(session, poller))
+            return poller, queue
+        return poller, poller.subscribe()
+
+    def _forget(self, session: tuple[str, str], poller: AnnouncementPoller) -> None:
+        if self.pollers.get(session) is poller:
+            del self.pollers[session]
+            del self.tasks[session]
+
+    async def close(self) -> None:
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            **poller_stats.stats(),
+            "pollers": len(self.pollers),
+            "subscribers": sum(len(p.subscribers) for p in self.pollers.values()),
+        }
+
+
+pollers = Pollers()
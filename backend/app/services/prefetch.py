@@ -0,0 +1,88 @@
+import asyncio
+import contextvars
+from collections.abc import Awaitable
+
+import httpx
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.core.codec import decode
+from app.core.config import settings
+from app.services.attendance import attendance
+from app.services.calendar import calendar
+from app.services.content import docs_many, sem
+from app.services.user import profile
+
+
+class PrefetchStats:
+    def __init__(self):
+        self.started = 0
+        self.skipped = 0
+        self.calls = 0
+        self.failures = 0
+
+    def stats(self) -> dict[str, int]:
+        return dict(vars(self))
+
+
+prefetch_stats = PrefetchStats()
+# one warm-up per session at a time, keyed like the response cache
+_warming: dict[tuple[str, str], asyncio.Task] = {}
+
+
+async def _call(call: Awaitable[httpx.Response]) -> httpx.Response | None:
+    prefetch_stats.calls += 1
+    try:
+        return await call
+    except Exception:
+        # best effort, the route makes the call again when it is asked
+        prefetch_stats.failures += 1
+        return None
+
+
+async def warm(
+    key: str,
+    user_id: str,
+    token: HTTPAuthorizationCredentials,
+    client: httpx.AsyncClient,
+) -> None:
+    # the same service calls the routes make, so the cache keys line up; a route
+    # asking while one is still in flight joins it through request coalescing
+    courses, *_ = await asyncio.gather(
+        _call(sem(key, user_id, token, client)),
+        _call(profile(user_id, key, token, client)),
+        _call(attendance(key, user_id, token, client)),
+        _call(calendar(key, token, client)),
+    )
+    if not settings.prefetch_course_contents or courses is None:
+        return
+    try:
+        course_ids = [str(item["id"]) for item in decode(courses)]
+    except (ValueError, TypeError, KeyError):
+        return
+    async for _, result in docs_many(
+        key, course_ids[: settings.prefetch_max_courses], token, client
+    ):
+        prefetch_stats.calls += 1
+        if isinstance(result, Exception):
+            prefetch_stats.failures += 1
+
+
+def schedule(
+    key: str | None,
+    user_id: str | None,
+    token: HTTPAuthorizationCredentials,
+    client: httpx.AsyncClient,
+) -> None:
+    if not (settings.prefetch_enabled and settings.cache_enabled and key and user_id):
+        return
+    session = (key, token.credentials)
+    if session in _warming:
+        prefetch_stats.skipped += 1
+        return
+    prefetch_stats.started += 1
+    # detached from the request so its deadline does not cut the warm-up short
+    task = asyncio.create_task(
+        warm(key, user_id, token, client), context=contextvars.Context()
+    )
+    _warming[session] = task
+    task.add_done_callback(lambda _: _warming.pop(session, None))
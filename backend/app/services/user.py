@@ -1,32 +1,137 @@
+import re
+from collections.abc import AsyncIterator
 from typing import Annotated
 
-from fastapi import Depends
+import httpx
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
 
-from app.core.http import HTTPClientDep, security
+from app.core.breaker import breakers
+from app.core.config import settings
+from app.core.http import HTTPClientDep, security, webservice
+from app.core.retry import with_retry
+from app.core.sessions import sessions
+from app.services.auth import release_later
+
+
+# web service, features and service keys are the first three on managetoken.php
+KEY_PATTERN = re.compile(r"[a-fA-F0-9]{32}")
+
+
+async def read_keys(chunks: AsyncIterator[str]) -> list[str]:
+    # stop as soon as the three keys are in, the rest of the page drains in the
+    # background
+    body = ""
+    async for chunk in chunks:
+        body += chunk
+        found = KEY_PATTERN.findall(body)
+        if len(found) >= 3:
+            return found[:3]
+    return KEY_PATTERN.findall(body)
 
 
 async def keys(
     session_key: str,
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
-):
-    return await client.get(
-        url="https://mydy.dypatil.edu/rait/user/managetoken.php",
+) -> tuple[int, list[str]]:
+    request = client.build_request(
+        "GET",
+        url=f"{settings.lms_url}/user/managetoken.php",
         params={"sesskey": session_key},
-        cookies={"MoodleSession": token.credentials},
+        headers={"Cookie": f"MoodleSession={token.credentials}"},
     )
 
+    async def send() -> httpx.Response:
+        response = await client.send(request, stream=True)
+        if response.status_code != 200:
+            # a retried response must not keep its connection
+            await response.aread()
+            await response.aclose()
+        return response
+
+    response = await with_retry(lambda: breakers["managetoken"].call(send))
+    if response.status_code != 200:
+        return response.status_code, []
+    chunks = response.aiter_text()
+    try:
+        found = await read_keys(chunks)
+    except BaseException:
+        await response.aclose()
+        raise
+    release_later(response, chunks)
+    return response.status_code, found
+
+
+async def resolve_keys(
+    session_key: str,
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+) -> list[str | None] | None:
+    session = await sessions.get(token.credentials)
+    if session is not None and any(session.keys):
+        return session.keys
+    status_code, found = await keys(session_key, token, client)
+    found = (found + [None] * 3)[:3]
+    if status_code != 200 or not any(found):
+        return None
+    await sessions.update(token.credentials, session_key=session_key, keys=found)
+    return found
+
+
+async def resolve_user_id(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    user_id: str | None = Header(None, alias="x-user-id"),
+) -> str:
+    # the header wins, otherwise whatever login recorded for this MoodleSession
+    if user_id:
+        return user_id
+    session = await sessions.get(token.credentials)
+    if session is None or not session.user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="x-user-id header missing and the session is unknown",
+        )
+    return session.user_id
+
+
+async def resolve_api_key(
+    token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    client: HTTPClientDep,
+    key: str | None = Header(None, alias="X-API-Key"),
+) -> str:
+    if key:
+        return key
+    session = await sessions.get(token.credentials)
+    if session is not None and not session.api_key and session.session_key:
+        # known session that never asked for its keys, resolve them once here
+        await resolve_keys(session.session_key, token, client)
+        session = await sessions.get(token.credentials)
+    if session is None or not session.api_key:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="X-API-Key header missing and the session has no known key",
+        )
+    return session.api_key
+
+
+UserIdDep = Annotated[str, Depends(resolve_user_id)]
+ApiKeyDep = Annotated[str, Depends(resolve_api_key)]
+
 
 async def old_profile(
     user_id: str,
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
 ):
-    return await client.get(
-        url="https://mydy.dypatil.edu/rait/local/users/profile.php",
-        params={"id": user_id},
-        headers={"Cookie": f"MoodleSession={token.credentials}"},
+    return await with_retry(
+        lambda: breakers["profile.php"].call(
+            lambda: client.get(
+                url=f"{settings.lms_url}/local/users/profile.php",
+                params={"id": user_id},
+                headers={"Cookie": f"MoodleSession={token.credentials}"},
+            )
+        )
     )
 
 
@@ -36,13 +141,10 @@ async def profile(
     token: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     client: HTTPClientDep,
 ):
-    return await client.get(
-        url="https://mydy.dypatil.edu/rait/webservice/rest/server.php",
-        params={
-            "wstoken": key,
-            "moodlewsrestformat": "json",
-            "wsfunction": "local_user_details_custom",
-            "userid": user_id,
-        },
-        headers={"Cookie": f"MoodleSession={token.credentials}"},
+    return await webservice(
+        client,
+        key,
+        token,
+        "local_user_details_custom",
+        userid=user_id,
     )
@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.core.config import settings
+from app.core.http import create_http_client
+from app.services.auth import login
+from bench.mock_lms import serve
+
+
+async def legacy_login(username: str, password: str) -> tuple[str, str | None]:
+    # the pre-pooling login path, kept here as the comparison baseline
+    async with httpx.AsyncClient(follow_redirects=True) as temp_client:
+        response = await temp_client.post(
+            url=f"{settings.lms_url}/login/index.php",
+            data={
+                "uname_static": username,
+                "username": username,
+                "uname": username,
+                "password": password,
+            },
+        )
+        return response.text, temp_client.cookies.get("MoodleSession")
+
+
+async def measure(name, fn, requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: list[float] = []
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            body, session = await fn()
+            timings.append(time.perf_counter() - start)
+            assert session, f"{name}: login did not return a MoodleSession"
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    print(
+        f"{name:<8} {requests / elapsed:>9.1f} req/s"
+        f"  p50 {statistics.median(timings) * 1000:>8.2f} ms"
+        f"  p95 {timings[int(len(timings) * 0.95) - 1] * 1000:>8.2f} ms"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    client = create_http_client()
+    try:
+        await measure(
+            "legacy",
+            lambda: legacy_login(args.username, args.password),
+            args.requests,
+            args.concurrency,
+        )
+        await measure(
+            "pooled",
+            lambda: login(args.username, args.password, client),
+            args.requests,
+            args.concurrency,
+        )
+    finally:
+        await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare login paths.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--page-kb", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--username", default="student")
+    parser.add_argument("--password", default="secret")
+    parser.add_argument(
+        "--base-url", help="benchmark a real LMS instead of the local mock"
+    )
+    args = parser.parse_args()
+
+    if args.base_url:
+        settings.lms_url = args.base_url
+        asyncio.run(run(args))
+        return
+    with serve(latency=args.latency, page_kb=args.page_kb) as url:
+        settings.lms_url = url
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import (
+    HTMLResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.routing import Route
+
+PREFIX = "/rait"
+USER_ID = "4242"
+SESSKEY = "AbCdEf1234"
+# web service, features and service keys, in the order managetoken lists them
+KEYS = (
+    "0123456789abcdef0123456789abcdef",
+    "fedcba9876543210fedcba9876543210",
+    "00112233445566778899aabbccddeeff",
+)
+INVALID_TOKEN = {
+    "exception": "moodle_exception",
+    "errorcode": "invalidtoken",
+    "message": "Invalid token - token not found",
+}
+
+
+class MockLMS:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        page_kb: int = 256,
+        courses: int = 8,
+        weeks: int = 12,
+        modules: int = 8,
+        docs: int = 3,
+        items: int = 50,
+        doc_kb: int = 64,
+        base_url: str = f"http://127.0.0.1{PREFIX}",
+    ):
+        # imported here, payloads pulls in the app settings and serve() callers
+        # may still need to point them at this mock
+        from bench import payloads
+
+        self.latency = latency
+        self.page_kb = page_kb
+        self.requests = 0
+        self.sessions: set[str] = set()
+        # sessions pluginfile refuses, as for a course they are not enrolled in
+        self.denied: set[str] = set()
+        # course ids whose contents come back in a shape the app does not expect
+        self.malformed: set[str] = set()
+        # bodies are built once, so the mock spends its time on I/O not JSON
+        self.wsfunctions = {
+            name: json.dumps(payload).encode()
+            for name, payload in {
+                "local_user_courses_custom": payloads.courses(courses),
+                "core_enrol_get_users_courses": payloads.courses(courses),
+                "core_course_get_contents": payloads.course_contents(
+                    weeks, modules, docs, base_url
+                ),
+                "local_user_attendence_custom": payloads.attendance(courses),
+                "core_calendar_get_calendar_events": payloads.events(items),
+                "local_user_announcements_custom": payloads.announcements(10),
+                "local_user_announcementsall_custom": payloads.announcements(items),
+                "local_user_details_custom": payloads.profile(),
+            }.items()
+        }
+        self.document = b"%PDF-1.4\n" + b"0" * (doc_kb * 1024)
+        self.app = Starlette(
+            routes=[
+                Route(f"{PREFIX}/login/index.php", self.login, methods=["GET", "POST"]),
+                Route(f"{PREFIX}/login/logout.php", self.logout),
+                Route(f"{PREFIX}/my/", self.dashboard),
+                Route(f"{PREFIX}/webservice/rest/server.php", self.webservice),
+                Route(f"{PREFIX}/user/managetoken.php", self.managetoken),
+                Route(f"{PREFIX}/local/users/profile.php", self.profile),
+                Route(f"{PREFIX}/webservice/pluginfile.php/{{path:path}}", self.file),
+            ]
+        )
+
+    async def _delay(self) -> None:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def login(self, request: Request):
+        await self._delay()
+        if request.method == "GET":
+            if request.cookies.get("MoodleSession") not in self.sessions:
+                return HTMLResponse("<html>login</html>")
+            return RedirectResponse(f"{PREFIX}/my/", status_code=303)
+        form = await request.form()
+        if form.get("password") == "wrong":
+            return HTMLResponse("<html>Invalid login, please try again</html>")
+        session = secrets.token_hex(13)
+        self.sessions.add(session)
+        response = RedirectResponse(
+            f"{PREFIX}/login/index.php?testsession={USER_ID}", status_code=303
+        )
+        response.set_cookie("MoodleSession", session, path=f"{PREFIX}/")
+        return response
+
+    async def logout(self, request: Request):
+        await self._delay()
+        self.sessions.discard(request.cookies.get("MoodleSession"))
+        return RedirectResponse(f"{PREFIX}/login/index.php", status_code=303)
+
+    async def webservice(self, request: Request):
+        await self._delay()
+        body = self.wsfunctions.get(request.query_params.get("wsfunction"))
+        if request.query_params.get("courseid") in self.malformed:
+            body = b'{"warnings": []}'
+        if request.query_params.get("wstoken") not in KEYS or body is None:
+            body = json.dumps(INVALID_TOKEN).encode()
+        return Response(body, media_type="application/json")
+
+    async def managetoken(self, request: Request):
+        await self._delay()
+        if request.cookies.get("MoodleSession") not in self.sessions:
+            return RedirectResponse(f"{PREFIX}/login/index.php", status_code=303)
+        rows = "".join(f"<tr><td>Service</td><td>{key}</td></tr>" for key in KEYS)
+        # the real page carries the whole theme around the table
+        footer = "<div>" + "x" * (self.page_kb * 1024) + "</div>"
+        return HTMLResponse(
+            f"<html><body><table>{rows}</table>{footer}</body></html>"
+        )
+
+    async def profile(self, request: Request):
+        await self._delay()
+        if request.cookies.get("MoodleSession") not in self.sessions:
+            return RedirectResponse(f"{PREFIX}/login/index.php", status_code=303)
+        cells = "".join(
+            f'<tr><td class="profile_td1">Field {field}</td>'
+            f'<td><span class="profile_td2">Value {field}</span></td></tr>'
+            for field in range(14)
+        )
+        return HTMLResponse(f"<html><body><table>{cells}</table></body></html>")
+
+    async def file(self, request: Request):
+        await self._delay()
+        if (
+            request.query_params.get("token") not in KEYS
+            or request.cookies.get("MoodleSession") in self.denied
+        ):
+            return Response(status_code=403)
+        size = len(self.document)
+        if request.headers.get("range") == f"bytes={size}-":
+            # a resume of a download that already finished
+            return Response(
+                status_code=416, headers={"content-range": f"bytes */{size}"}
+            )
+        return Response(self.document, media_type="application/pdf")
+
+    async def dashboard(self, request: Request):
+        await self._delay()
+        if request.cookies.get("MoodleSession") not in self.sessions:
+            return RedirectResponse(f"{PREFIX}/login/index.php", status_code=303)
+        return StreamingResponse(self._dashboard_page(), media_type="text/html")
+
+    async def _dashboard_page(self):
+        yield (
+            "<html><head><script>"
+            f'M.cfg = {{"wwwroot":"{PREFIX}","sesskey":"{SESSKEY}"}};'
+            "</script></head><body>"
+            f'<a href="{PREFIX}/user/profile.php?id={USER_ID}">Profile</a>'
+            "<h2>Academic Status</h2>"
+        ).encode()
+        filler = (b"<div class='block'>" + b"x" * 1000 + b"</div>\n") * 16
+        for _ in range(self.page_kb // 16):
+            yield filler
+        yield b"</body></html>"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(latency: float = 0.0, page_kb: int = 256, **sizes: int) -> Iterator[str]:
+    # separate process, so the mock does not compete with the client for the GIL
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "bench.mock_lms",
+            f"--port={port}",
+            f"--latency={latency}",
+            f"--page-kb={page_kb}",
+            *(f"--{name.replace('_', '-')}={value}" for name, value in sizes.items()),
+        ]
+    )
+    try:
+        while True:
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=1):
+                    break
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError("mock LMS failed to start")
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}{PREFIX}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def add_size_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("payload sizes")
+    group.add_argument("--courses", type=int, default=8)
+    group.add_argument("--weeks", type=int, default=12, help="weeks per course")
+    group.add_argument("--modules", type=int, default=8, help="modules per week")
+    group.add_argument("--docs", type=int, default=3, help="files per module")
+    group.add_argument("--items", type=int, default=50, help="events, announcements")
+    group.add_argument("--doc-kb", type=int, default=64, help="size of each file")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the LMS.")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--page-kb", type=int, default=256)
+    add_size_arguments(parser)
+    args = parser.parse_args()
+    mock = MockLMS(
+        latency=args.latency,
+        page_kb=args.page_kb,
+        courses=args.courses,
+        weeks=args.weeks,
+        modules=args.modules,
+        docs=args.docs,
+        items=args.items,
+        doc_kb=args.doc_kb,
+        base_url=f"http://127.0.0.1:{args.port}{PREFIX}",
+    )
+    uvicorn.run(mock.app, host="127.0.0.1", port=args.port, log_level="error")
+
+
+if __name__ == "__main__":
+    main()
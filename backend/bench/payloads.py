@@ -0,0 +1,193 @@
+import argparse
+import json
+import statistics
+import time
+from collections.abc import Callable
+
+import httpx
+from pydantic import TypeAdapter
+
+from app.core import codec
+from app.schemas.content import WeekBase
+
+
+def course_contents(
+    weeks: int, modules: int, docs: int, base_url: str = "https://lms.example"
+) -> list[dict]:
+    # same shape as core_course_get_contents
+    return [
+        {
+            "id": week,
+            "name": f"Week {week}",
+            "summary": "<p>" + "Lecture notes and assignments. " * 8 + "</p>",
+            "modules": [
+                {
+                    "id": week * 1000 + module,
+                    "name": f"Unit {week}.{module} reading material",
+                    "modname": "resource" if module % 3 else "folder",
+                    "url": f"{base_url}/mod/resource/view.php?id={module}",
+                    "contents": [
+                        {
+                            "type": "file",
+                            "filename": f"unit-{week}-{module}-{doc}.pdf",
+                            "filepath": "/",
+                            "filesize": 48213 + doc,
+                            "fileurl": (
+                                f"{base_url}/webservice/pluginfile.php/"
+                                f"{week}/mod_resource/content/{module}/{doc}.pdf"
+                            ),
+                            "timecreated": 1700000000 + doc,
+                            "timemodified": 1700003600 + doc,
+                            "mimetype": "application/pdf",
+                            "author": "Prof. A. Example",
+                        }
+                        for doc in range(docs)
+                    ],
+                }
+                for module in range(modules)
+            ],
+        }
+        for week in range(weeks)
+    ]
+
+
+def courses(count: int) -> list[dict]:
+    # local_user_courses_custom and core_enrol_get_users_courses
+    return [
+        {
+            "id": 100 + course,
+            "shortname": f"CS{300 + course}",
+            "fullname": f"Course {course}: Distributed Systems and Networks",
+            "enrolledusercount": 64,
+            "instructorname": "Prof. A. Example",
+            "planname": "Semester 5",
+            "semesterperiod": "2025-26",
+            "summary": "<p>" + "Course overview. " * 12 + "</p>",
+        }
+        for course in range(count)
+    ]
+
+
+def attendance(count: int) -> list[dict]:
+    return [
+        {
+            "classcode": f"CS{300 + course}",
+            "totalclass": 40,
+            "total_present": 34,
+            "total_absent": 6,
+            "presentage": 85.0,
+        }
+        for course in range(count)
+    ]
+
+
+def events(count: int) -> dict:
+    return {
+        "events": [
+            {
+                "id": event,
+                "name": f"Assignment {event} due",
+                "description": "<p>" + "Submit the report. " * 6 + "</p>",
+                "timestart": 1760000000 + event * 3600,
+                "timemodified": 1750000000 + event,
+                "eventtype": "due",
+            }
+            for event in range(count)
+        ],
+        "warnings": [],
+    }
+
+
+def announcements(count: int) -> list[dict]:
+    return [
+        {
+            "postid": str(9000 + post),
+            "subject": f"Notice {post}",
+            "message": "<p>" + "Lectures are rescheduled this week. " * 10 + "</p>",
+            "postuser_name": "Exam Cell",
+            "created_date": "2025-10-01 10:00:00",
+        }
+        for post in range(count)
+    ]
+
+
+def profile() -> list[dict]:
+    # local_user_details_custom, the route returns the last entry
+    return [
+        {
+            "firstname": "Student",
+            "lastname": "Example",
+            "rollid": "21CE1042",
+            "dob": "2003-01-01",
+            "city": "Navi Mumbai",
+            "fathername": "Father Example",
+            "mothername": "Mother Example",
+            "phonenumber": "9000000000",
+            "town": "Nerul",
+            "email": "student@example.edu",
+        }
+    ]
+
+
+# what FastAPI does with a returned list when response_model is set
+response_field = TypeAdapter(list[WeekBase])
+
+
+def legacy(response: httpx.Response) -> bytes:
+    # the pre-codec route: up to three json() parses, per-item validation,
+    # then FastAPI validates the models again against response_model
+    if isinstance(response.json(), dict) and response.json().get("exception"):
+        raise ValueError(response.json().get("message"))
+    data = [WeekBase.model_validate(item) for item in response.json()]
+    return response_field.dump_json(
+        response_field.validate_python(data, from_attributes=True)
+    )
+
+
+def current(response: httpx.Response) -> bytes:
+    if codec.is_object(response) and codec.decode(response).get("exception"):
+        raise ValueError(codec.decode(response).get("message"))
+    data = codec.parse(list[WeekBase], response)
+    return codec.ModelResponse(list[WeekBase], data).body
+
+
+def measure(name: str, fn: Callable[[httpx.Response], bytes], raw: bytes, n: int):
+    cpu: list[float] = []
+    output = b""
+    for _ in range(n):
+        # a fresh response each time, like an uncached upstream call
+        response = httpx.Response(200, content=raw)
+        start = time.process_time()
+        output = fn(response)
+        cpu.append(time.process_time() - start)
+    print(
+        f"{name:<8} mean {statistics.mean(cpu) * 1000:>8.2f} ms"
+        f"  p50 {statistics.median(cpu) * 1000:>8.2f} ms"
+        f"  min {min(cpu) * 1000:>8.2f} ms  cpu/request"
+    )
+    return statistics.mean(cpu), output
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="CPU per request for the course docs response pipeline."
+    )
+    parser.add_argument("--weeks", type=int, default=20)
+    parser.add_argument("--modules", type=int, default=15)
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    raw = json.dumps(course_contents(args.weeks, args.modules, args.docs)).encode()
+    print(
+        f"payload {len(raw) / 1024:.0f} KiB, "
+        f"decoder {'orjson' if codec.orjson else 'json'}"
+    )
+    before, expected = measure("legacy", legacy, raw, args.requests)
+    after, output = measure("current", current, raw, args.requests)
+    assert json.loads(output) == json.loads(expected), "pipelines disagree"
+    print(f"saved    {(before - after) * 1000:>8.2f} ms  ({1 - after / before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
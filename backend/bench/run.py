@@ -0,0 +1,385 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+import httpx
+
+from bench.mock_lms import add_size_arguments, free_port, serve
+
+MCP_HEADERS = {"accept": "application/json, text/event-stream"}
+# the MCP session matches responses to requests by id, concurrent calls need
+# distinct ones
+request_ids = itertools.count(1)
+
+
+@dataclass
+class Session:
+    token: str
+    session_key: str
+    user_id: str
+    key: str
+    mcp_session: str | None = None
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {
+            "authorization": f"Bearer {self.token}",
+            "x-user-id": self.user_id,
+            "x-api-key": self.key,
+        }
+
+
+@dataclass
+class Scenario:
+    name: str
+    send: Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+    # for MCP tools a 200 can still carry a failed call
+    check: Callable[[httpx.Response], bool] = lambda response: response.is_success
+
+
+@dataclass
+class Result:
+    name: str
+    requests: int
+    errors: int
+    elapsed: float
+    timings: list[float] = field(repr=False)
+    rss_mb: float
+    rss_delta_mb: float
+
+    def percentile(self, q: float) -> float:
+        if not self.timings:
+            return math.nan
+        return self.timings[max(0, math.ceil(q * len(self.timings)) - 1)] * 1000
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rps": round(self.requests / self.elapsed, 1),
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "rss_mb": round(self.rss_mb, 1),
+            "rss_delta_mb": round(self.rss_delta_mb, 1),
+        }
+
+
+def rss_mb(pid: int) -> float:
+    # current resident set size, needs procfs (linux)
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        return math.nan
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+async def measure(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    pid: int,
+) -> Result:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: list[float] = []
+    errors = 0
+
+    async def one() -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await scenario.send(client)
+                await response.aread()
+                ok = scenario.check(response)
+            except Exception:
+                ok = False
+            timings.append(time.perf_counter() - start)
+            errors += not ok
+
+    before = rss_mb(pid)
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    after = rss_mb(pid)
+    timings.sort()
+    return Result(
+        scenario.name, requests, errors, elapsed, timings, after, after - before
+    )
+
+
+def get(path: str, session: Session, **params) -> Scenario:
+    return Scenario(
+        f"GET {path}",
+        lambda client: client.get(path, params=params, headers=session.headers),
+    )
+
+
+def mcp_call(session: Session, tool: str, **arguments) -> Scenario:
+    async def send(client: httpx.AsyncClient) -> httpx.Response:
+        return await client.post(
+            "/mcp",
+            headers={
+                **MCP_HEADERS,
+                **session.headers,
+                "mcp-session-id": session.mcp_session or "",
+            },
+            json={
+                "jsonrpc": "2.0",
+                "id": next(request_ids),
+                "method": "tools/call",
+                "params": {"name": tool, "arguments": arguments},
+            },
+        )
+
+    def check(response: httpx.Response) -> bool:
+        if not response.is_success:
+            return False
+        result = response.json().get("result")
+        return result is not None and not result.get("isError")
+
+    return Scenario(f"MCP {tool}", send, check)
+
+
+async def start_session(
+    client: httpx.AsyncClient, username: str, password: str
+) -> Session:
+    response = await client.post(
+        "/v1/auth/login", data={"username": username, "password": password}
+    )
+    response.raise_for_status()
+    login = response.json()
+    response = await client.get(
+        "/v1/user/keys",
+        params={"session_key": login["session_key"]},
+        headers={"authorization": f"Bearer {login['session_token']}"},
+    )
+    response.raise_for_status()
+    session = Session(
+        token=login["session_token"],
+        session_key=login["session_key"],
+        user_id=login["user_id"],
+        key=response.json()["features_service_key"],
+    )
+    response = await client.post(
+        "/mcp",
+        headers=MCP_HEADERS,
+        json={
+            "jsonrpc": "2.0",
+            "id": next(request_ids),
+            "method": "initialize",
+            "params": {
+                "protocolVersion": "2025-03-26",
+                "capabilities": {},
+                "clientInfo": {"name": "bench", "version": "1"},
+            },
+        },
+    )
+    response.raise_for_status()
+    session.mcp_session = response.headers.get("mcp-session-id")
+    await client.post(
+        "/mcp",
+        headers={**MCP_HEADERS, "mcp-session-id": session.mcp_session or ""},
+        json={"jsonrpc": "2.0", "method": "notifications/initialized"},
+    )
+    return session
+
+
+def scenarios(session: Session, args: argparse.Namespace) -> list[Scenario]:
+    course_id = "100"
+    file_url = (
+        f"{os.environ['LMS_URL']}/webservice/pluginfile.php"
+        "/0/mod_resource/content/0/0.pdf"
+    )
+    return [
+        get("/api", session),
+        get("/health", session),
+        get("/metrics", session),
+        get("/v1/user/keys", session, session_key=session.session_key),
+        get("/v0/user/profile", session),
+        get("/v1/user/profile", session),
+        get("/v1/content/current-course", session),
+        get("/v1/content/course", session),
+        get(f"/v1/content/course/{course_id}", session),
+        get("/v1/content/courses/contents", session),
+        get("/v1/content/search", session, q="unit reading"),
+        get(f"/v1/content/course/{course_id}/changes", session),
+        get("/v1/content/changes", session),
+        get("/v1/content/file", session, url=file_url, title="unit.pdf"),
+        get("/v1/content/export", session, course_id=course_id),
+        get("/v1/annoucement", session),
+        get("/v1/annoucement/all", session),
+        get("/v1/calendar", session),
+        get("/v1/attendance", session),
+        get("/v1/dashboard", session),
+        mcp_call(session, "get_user_profile_detailed"),
+        mcp_call(session, "get_user_profile"),
+        mcp_call(session, "get_current_semester_courses"),
+        mcp_call(session, "get_enrolled_courses"),
+        mcp_call(session, "get_course_docs", course_id=course_id),
+        mcp_call(session, "get_all_course_docs"),
+        mcp_call(session, "search_course_docs", q="unit reading"),
+        mcp_call(session, "get_content_changes"),
+        mcp_call(session, "get_calendar_events"),
+        mcp_call(session, "get_all_announcements"),
+        mcp_call(session, "fetch_latest_annoucements"),
+        mcp_call(session, "get_attendance"),
+        mcp_call(session, "get_dashboard"),
+        Scenario(
+            "POST /v1/auth/login",
+            lambda client: client.post(
+                "/v1/auth/login",
+                data={"username": args.username, "password": args.password},
+            ),
+        ),
+        # last, it ends the session the other scenarios use
+        get("/v1/auth/logout", session, session_key=session.session_key),
+    ]
+
+
+@asynccontextmanager
+async def in_process() -> AsyncIterator[tuple[httpx.AsyncClient, int]]:
+    # imported late so the environment set up in main() reaches the settings.
+    # ASGITransport buffers whole response bodies, so streamed routes (export,
+    # file) use far more memory here than over uvicorn
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            yield client, os.getpid()
+
+
+@asynccontextmanager
+async def over_uvicorn(workers: int) -> AsyncIterator[tuple[httpx.AsyncClient, int]]:
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            f"--port={port}",
+            f"--workers={workers}",
+            "--log-level=warning",
+        ],
+        # the app switches MCP to stateless handling when it has several workers
+        env={**os.environ, "WORKERS": str(workers)},
+    )
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}",
+            limits=httpx.Limits(max_connections=None),
+            timeout=60,
+        ) as client:
+            while True:
+                try:
+                    await client.get("/api")
+                    break
+                except httpx.TransportError:
+                    if process.poll() is not None:
+                        raise RuntimeError("uvicorn failed to start")
+                    await asyncio.sleep(0.1)
+            yield client, process.pid
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    target = in_process() if args.mode == "asgi" else over_uvicorn(args.workers)
+    results = []
+    async with target as (client, pid):
+        session = await start_session(client, args.username, args.password)
+        for scenario in scenarios(session, args):
+            if args.only and not any(name in scenario.name for name in args.only):
+                continue
+            for _ in range(args.warmup):
+                await scenario.send(client)
+            result = await measure(
+                client, scenario, args.requests, args.concurrency, pid
+            )
+            report(result)
+            results.append(result.as_dict())
+    return results
+
+
+def report(result: Result) -> None:
+    row = result.as_dict()
+    print(
+        f"{row['name']:<42} {row['rps']:>9.1f} req/s"
+        f"  p50 {row['p50_ms']:>8.2f}  p95 {row['p95_ms']:>8.2f}"
+        f"  p99 {row['p99_ms']:>8.2f} ms"
+        f"  rss {row['rss_mb']:>7.1f} MiB ({row['rss_delta_mb']:+.1f})"
+        + (f"  errors {row['errors']}" if row["errors"] else ""),
+        flush=True,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark every route and MCP tool against a local mock LMS."
+    )
+    parser.add_argument("--mode", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn mode only")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--page-kb", type=int, default=256)
+    parser.add_argument("--no-cache", action="store_true", help="disable app caches")
+    parser.add_argument(
+        "--only", action="append", help="run scenarios whose name contains this"
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--username", default="student")
+    parser.add_argument("--password", default="secret")
+    add_size_arguments(parser)
+    args = parser.parse_args()
+
+    sizes = {
+        "courses": args.courses,
+        "weeks": args.weeks,
+        "modules": args.modules,
+        "docs": args.docs,
+        "items": args.items,
+        "doc_kb": args.doc_kb,
+    }
+    with (
+        serve(latency=args.latency, page_kb=args.page_kb, **sizes) as url,
+        tempfile.TemporaryDirectory() as data_dir,
+    ):
+        # the app reads these when it is imported (asgi) or started (uvicorn)
+        os.environ["LMS_URL"] = url
+        os.environ["DATA_DIR"] = data_dir
+        if args.no_cache:
+            os.environ["CACHE_ENABLED"] = "false"
+            os.environ["DOC_CACHE_ENABLED"] = "false"
+        print(
+            f"mode {args.mode}, {args.requests} requests per scenario, "
+            f"concurrency {args.concurrency}, upstream latency {args.latency}s, "
+            f"cache {'off' if args.no_cache else 'on'}"
+        )
+        results = asyncio.run(run(args))
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({"args": vars(args), "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+# before anything imports the app settings
+os.environ["LMS_URL"] = "http://lms.test/rait"
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="mydylms-tests-")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from app.core.http import http_state, response_cache  # noqa: E402
+from app.main import app  # noqa: E402
+from bench.mock_lms import MockLMS  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def lms():
+    return MockLMS(base_url=os.environ["LMS_URL"], doc_kb=4)
+
+
+@pytest.fixture
+async def client(lms):
+    # the app's upstream client talks to the mock in-process
+    async with app.router.lifespan_context(app):
+        real = http_state.client
+        http_state.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=lms.app),
+            event_hooks=real.event_hooks,
+        )
+        try:
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://test"
+            ) as client:
+                yield client
+        finally:
+            await http_state.client.aclose()
+            http_state.client = real
+            await response_cache.clear()
+
+
+async def login(client: httpx.AsyncClient) -> dict[str, str]:
+    # the headers the frontend sends after logging in
+    response = await client.post(
+        "/v1/auth/login", data={"username": "student", "password": "secret"}
+    )
+    response.raise_for_status()
+    login = response.json()
+    headers = {"authorization": f"Bearer {login['session_token']}"}
+    response = await client.get(
+        "/v1/user/keys", params={"session_key": login["session_key"]}, headers=headers
+    )
+    response.raise_for_status()
+    return {
+        **headers,
+        "x-user-id": login["user_id"],
+        "x-api-key": response.json()["features_service_key"],
+    }
+
+
+@pytest.fixture
+async def session(client):
+    return await login(client)
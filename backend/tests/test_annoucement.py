@@ -0,0 +1,27 @@
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+
+from app.core.http import http_state
+from app.services.poller import pollers
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_stream_rejects_unchecked_key(client, session):
+    response = await client.get(
+        "/v1/annoucement/stream", headers={**session, "x-api-key": "garbage"}
+    )
+    assert response.status_code == 401
+    assert not pollers.pollers
+
+
+async def test_pollers_are_per_session(client, session):
+    victim = HTTPAuthorizationCredentials(scheme="Bearer", credentials="victim")
+    other = HTTPAuthorizationCredentials(scheme="Bearer", credentials="other")
+    try:
+        poller, _ = pollers.subscribe("4242", "good", victim, http_state.client)
+        joined, _ = pollers.subscribe("4242", "garbage", other, http_state.client)
+        assert joined is not poller
+        assert (poller.key, poller.token) == ("good", victim)
+    finally:
+        await pollers.close()
@@ -0,0 +1,32 @@
+import pytest
+
+from bench.mock_lms import SESSKEY
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_logout_orphans_cached_responses(client, session, lms):
+    response = await client.get("/v1/attendance", headers=session)
+    assert response.status_code == 200
+    requests = lms.requests
+    await client.get("/v1/attendance", headers=session)
+    assert lms.requests == requests
+
+    response = await client.get(
+        "/v1/auth/logout", params={"session_key": SESSKEY}, headers=session
+    )
+    assert response.status_code == 200
+    requests = lms.requests
+    await client.get("/v1/attendance", headers=session)
+    # nothing cached for the session before logout is served after it
+    assert lms.requests == requests + 1
+
+
+async def test_logout_forgets_the_session(client, session):
+    await client.get(
+        "/v1/auth/logout", params={"session_key": SESSKEY}, headers=session
+    )
+    response = await client.get(
+        "/v1/attendance", headers={"authorization": session["authorization"]}
+    )
+    assert response.status_code == 401
@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+from app.core.breaker import CircuitBreaker
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cancelled_waiter_returns_handed_over_slot():
+    breaker = CircuitBreaker("test")
+    breaker.limit = 1
+    breaker.in_flight = 1
+    waiting = asyncio.create_task(breaker.call(lambda: asyncio.sleep(0)))
+    await asyncio.sleep(0)
+    assert breaker.stats()["queued"] == 1
+    # the slot goes to the waiter, which is cancelled before it resumes
+    breaker.release()
+    waiting.cancel()
+    # 3.12's wait_for lets the cancellation through, older ones swallow it
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert breaker.in_flight == 0
+    assert breaker.admit() == "go"
@@ -0,0 +1,27 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core import cache, http
+from bench.mock_lms import INVALID_TOKEN
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_expired_refresh_drops_stale_entry(client, session, lms, monkeypatch):
+    response = await client.get("/v1/calendar", headers=session)
+    assert response.status_code == 200
+    # past the ttl, still inside the serve-stale window
+    now = cache.clock()
+    monkeypatch.setattr(cache, "clock", lambda: now + 300)
+    lms.wsfunctions["core_calendar_get_calendar_events"] = json.dumps(
+        INVALID_TOKEN
+    ).encode()
+    response = await client.get("/v1/calendar", headers=session)
+    assert response.status_code == 200
+    while http._refreshing:
+        await asyncio.sleep(0.01)
+    # the refresh came back invalidtoken, the old payload is gone with it
+    response = await client.get("/v1/calendar", headers=session)
+    assert response.status_code == 400
@@ -0,0 +1,29 @@
+from app.core.calendar import EventIndex, to_ical
+from app.core.codec import validate
+from app.schemas.calendar import CalendarBase
+
+
+def events(*items: tuple[int | None, int]) -> list[CalendarBase]:
+    return validate(
+        list[CalendarBase],
+        [
+            {"id": id, "name": f"event {start}", "timestart": start}
+            for id, start in items
+        ],
+    )
+
+
+def test_range_is_sorted_and_bounded():
+    index = EventIndex()
+    index.apply(events((1, 300), (2, 100), (3, 200), (4, 400)))
+    assert [event.id for event in index.range(150, 400)] == [3, 1]
+    assert [event.id for event in index.range(0, None, 2)] == [2, 3]
+
+
+def test_events_without_id_are_kept():
+    index = EventIndex()
+    index.apply(events((1, 100), (None, 200), (None, 300)))
+    assert [event.date for event in index.range()] == [100, 200, 300]
+    index.apply(events((1, 100), (None, 250)))
+    assert [event.date for event in index.range()] == [100, 250]
+    assert to_ical(index.range(), "test").count("UID:") == 2
@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+
+from tests.conftest import login
+
+pytestmark = pytest.mark.anyio
+
+FILE_URL = (
+    f"{os.environ['LMS_URL']}/webservice/pluginfile.php/0/mod_resource/content/0/0.pdf"
+)
+
+
+async def test_cached_file_needs_valid_credentials(client, session, lms):
+    params = {"url": FILE_URL, "modified": 1700003600}
+    response = await client.get("/v1/content/file", params=params, headers=session)
+    assert response.status_code == 200
+    assert response.content == lms.document
+
+    response = await client.get(
+        "/v1/content/file",
+        params=params,
+        headers={"authorization": "Bearer nope", "x-api-key": "garbage"},
+    )
+    assert response.status_code in (400, 401)
+    assert response.content != lms.document
+
+
+async def test_cached_file_served_to_same_session(client, session, lms):
+    params = {"url": FILE_URL, "modified": 1700003601}
+    await client.get("/v1/content/file", params=params, headers=session)
+    requests = lms.requests
+    response = await client.get("/v1/content/file", params=params, headers=session)
+    assert response.status_code == 200
+    assert response.content == lms.document
+    assert lms.requests == requests
+
+
+async def test_cached_file_asks_moodle_for_other_sessions(client, session, lms):
+    params = {"url": FILE_URL, "modified": 1700003602}
+    await client.get("/v1/content/file", params=params, headers=session)
+    allowed, denied = await login(client), await login(client)
+    lms.denied.add(denied["authorization"].removeprefix("Bearer "))
+
+    response = await client.get("/v1/content/file", params=params, headers=denied)
+    assert response.status_code == 401
+
+    requests = lms.requests
+    response = await client.get("/v1/content/file", params=params, headers=allowed)
+    assert response.status_code == 200
+    assert response.content == lms.document
+    assert lms.requests == requests + 1
+    # moodle said yes once, the next hit stays local
+    await client.get("/v1/content/file", params=params, headers=allowed)
+    assert lms.requests == requests + 1
+
+
+async def test_finished_resume_is_416(client, session, lms):
+    size = len(lms.document)
+    response = await client.get(
+        "/v1/content/file",
+        params={"url": FILE_URL},
+        headers={**session, "range": f"bytes={size}-"},
+    )
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+
+@pytest.mark.parametrize("accept", ["application/json", "application/x-ndjson"])
+async def test_malformed_course_fails_alone(client, session, lms, accept):
+    lms.malformed.add("102")
+    response = await client.get(
+        "/v1/content/courses/contents",
+        params={"course_id": [101, 102, 103]},
+        headers={**session, "accept": accept},
+    )
+    assert response.status_code == 200
+    if accept == "application/json":
+        courses = response.json()
+    else:
+        courses = [json.loads(line) for line in response.text.splitlines()]
+    errors = {course["id"]: course["error"] for course in courses}
+    assert errors == {101: None, 102: "unexpected course data", 103: None}
@@ -0,0 +1,24 @@
+import io
+import zipfile
+
+import pytest
+
+from app.core.files import document_store
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_export_survives_files_over_the_cache_budget(
+    client, session, lms, monkeypatch
+):
+    # every file is evicted as soon as it was stored
+    monkeypatch.setattr(document_store, "max_bytes", len(lms.document) // 2)
+    response = await client.get(
+        "/v1/content/export", params={"course_id": 100}, headers=session
+    )
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+        assert names
+        assert "_failed.txt" not in names
+        assert archive.read(names[0]) == lms.document
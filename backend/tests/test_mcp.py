@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def rpc(client, headers: dict, method: str, **params) -> dict:
+    response = await client.post(
+        "/mcp",
+        json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params},
+        headers={"accept": "application/json, text/event-stream", **headers},
+    )
+    assert response.status_code == 200
+    headers["mcp-session-id"] = response.headers["mcp-session-id"]
+    return response.json()["result"]
+
+
+async def test_tools_run_with_forwarded_headers(client, session):
+    headers = dict(session)
+    result = await rpc(
+        client,
+        headers,
+        "initialize",
+        protocolVersion="2025-03-26",
+        capabilities={},
+        clientInfo={"name": "tests", "version": "0"},
+    )
+    assert result["serverInfo"]["name"]
+    await client.post(
+        "/mcp",
+        json={"jsonrpc": "2.0", "method": "notifications/initialized"},
+        headers={"accept": "application/json, text/event-stream", **headers},
+    )
+
+    tools = await rpc(client, headers, "tools/list")
+    names = {tool["name"] for tool in tools["tools"]}
+    assert {"get_enrolled_courses", "search_course_docs"} <= names
+
+    result = await rpc(
+        client, headers, "tools/call", name="get_enrolled_courses", arguments={}
+    )
+    courses = json.loads(result["content"][0]["text"])
+    assert courses and all("sub_code" in course for course in courses)
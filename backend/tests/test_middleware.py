@@ -0,0 +1,33 @@
+import pytest
+
+from app.core.config import settings
+from app.core.middleware import request_budget
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_change_feeds_are_not_cached(client, session):
+    for path in ("/v1/content/changes", "/v1/content/course/100/changes"):
+        response = await client.get(path, headers=session)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "private, no-cache"
+
+
+async def test_cached_routes_vary_on_user(client, session):
+    response = await client.get("/v1/content/course/100", headers=session)
+    assert response.headers["cache-control"].startswith("private, max-age=")
+    assert "X-User-Id" in response.headers["vary"]
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-1", "0", "soon"])
+def test_bad_request_timeout_falls_back_to_default(value):
+    scope = {"type": "http", "headers": [(b"x-request-timeout", value.encode())]}
+    assert request_budget(scope) == settings.request_deadline
+
+
+async def test_request_deadline_answers_504(client, session, lms):
+    lms.latency = 1
+    response = await client.get(
+        "/v1/attendance", headers={**session, "x-request-timeout": "0.1"}
+    )
+    assert response.status_code == 504
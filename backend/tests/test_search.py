@@ -0,0 +1,16 @@
+import pytest
+
+from app.core.search import SearchIndex
+from tests.test_sync import course
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_index_is_per_user():
+    index = SearchIndex(":memory:")
+    await index.index_course("full", 1, "a", course(5))
+    await index.index_course("restricted", 1, "b", course(5, hidden=True))
+    assert len(await index.search("full", "unit", [1])) == 5
+    assert len(await index.search("restricted", "unit", [1])) == 4
+    assert await index.stale("full", [1], 60) == []
+    assert await index.stale("other", [1], 60) == [1]
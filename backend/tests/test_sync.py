@@ -0,0 +1,63 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.core.codec import validate
+from app.core.sync import ContentSync
+from app.schemas.content import WeekBase
+from bench import payloads
+
+pytestmark = pytest.mark.anyio
+
+
+def course(docs: int, hidden: bool = False) -> list[WeekBase]:
+    weeks = payloads.course_contents(1, docs, 1)
+    for number, module in enumerate(weeks[0]["modules"]):
+        for content in module["contents"]:
+            # every doc its own timestamp
+            content["timecreated"] = 1700000000 + number
+    if hidden:
+        weeks[0]["modules"].pop()
+    return validate(list[WeekBase], weeks)
+
+
+async def test_cursor_pages_through_every_change():
+    sync = ContentSync(":memory:")
+    await sync.sync("key", 1, "digest", course(500))
+    since, seen = 0.0, []
+    while True:
+        changes = await sync.changes("key", [1], since, 50)
+        assert len(changes["added"]) <= 50
+        seen += changes["added"]
+        since = changes["until"]
+        if not changes["has_more"]:
+            break
+    assert len(seen) == 500
+    assert not (await sync.changes("key", [1], since, 50))["added"]
+
+
+async def test_snapshots_are_per_user():
+    sync = ContentSync(":memory:")
+    await sync.sync("full", 1, "a", course(5))
+    await sync.sync("restricted", 1, "b", course(5, hidden=True))
+    since = (await sync.changes("full", [1], 0))["until"]
+    # new digests force a full diff against each user's own snapshot
+    await sync.sync("full", 1, "c", course(5))
+    await sync.sync("restricted", 1, "d", course(5, hidden=True))
+    assert not (await sync.changes("full", [1], since))["removed"]
+    assert not (await sync.changes("restricted", [1], since))["added"]
+
+
+async def test_locked_database_skips_the_round(tmp_path):
+    path = str(tmp_path / "sync.db")
+    sync = ContentSync(path)
+    writer = sqlite3.connect(path)
+    writer.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    assert not await sync.sync("key", 1, "digest", course(5))
+    assert time.monotonic() - started < 3
+    writer.rollback()
+    # the snapshot rolled back with it, the next fetch diffs again
+    assert await sync.sync("key", 1, "digest", course(5))
+    assert len((await sync.changes("key", [1], 0))["added"]) == 5
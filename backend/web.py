@@ -1,7 +1,9 @@
+import argparse
+import os
 import socket
 
 import uvicorn
-from app.main import app
+from app.core.config import settings
 
 
 def find_available_port(
@@ -22,6 +24,25 @@ def find_available_port(
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=settings.workers)
+    args = parser.parse_args()
+    if args.workers > 1 and settings.cache_backend == "memory":
+        print(
+            "CACHE_BACKEND=memory keeps a separate response cache per worker, "
+            "set it to sqlite or redis to share one",
+            flush=True,
+        )
+
+    # worker processes import the app from the string below and read their
+    # settings again, WORKERS also decides how they handle MCP sessions
+    os.environ["WORKERS"] = str(args.workers)
     port = find_available_port(8000)
     print(f"PORT={port}", flush=True)
-    uvicorn.run(app, host="127.0.0.1", port=port, reload=False)
+    uvicorn.run(
+        "app.main:app",
+        host="127.0.0.1",
+        port=port,
+        reload=False,
+        workers=args.workers,
+    )
@@ -102,10 +102,11 @@ async function apiLogin(username: string, password: string): Promise<SessionData
   return res.json();
 }
 
-async function apiFetchKeys(session_token: string, session_key: string): Promise<KeysData> {
+async function apiFetchKeys(session_token: string, session_key: string, user_id: string): Promise<KeysData> {
+  // X-User-Id lets the backend warm its cache for the first screen
   const res = await fetch(
     `${API_BASE}/v1/user/keys?session_key=${encodeURIComponent(session_key)}`,
-    { headers: { Authorization: `Bearer ${session_token}` } }
+    { headers: { Authorization: `Bearer ${session_token}`, "X-User-Id": user_id } }
   );
   if (!res.ok) throw new Error(await extractError(res));
   return res.json();
@@ -733,7 +734,7 @@ function LoginScreen({ onLogin }: { onLogin: () => void }) {
       const session = await apiLogin(email.trim(), password);
       localStorage.setItem(SESSION_KEY, JSON.stringify(session));
       setLoadingStep("session");
-      const keys = await apiFetchKeys(session.session_token, session.session_key);
+      const keys = await apiFetchKeys(session.session_token, session.session_key, session.user_id);
       localStorage.setItem(KEYS_KEY, JSON.stringify(keys));
 
       try {